@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Benchmark CLI startup with python -X importtime and enforce an import budget
+
+Usage: uv run benchmarks/startup.py [--budget-ms 150] [--runs 5]
+
+Fails when an entry point exceeds the budget or imports a heavy dependency
+that should only load inside the command that needs it.
+"""
+
+import argparse
+import subprocess
+import sys
+
+# Entry point, the module it imports, and heavy modules it must not pull in.
+ENTRY_POINTS = [
+    ("sanoma --help", "sanoma.main", ["pandas", "numpy", "matplotlib", "yaml"]),
+    ("sanoma extract", "sanoma.lib.extract", ["pandas", "numpy", "matplotlib"]),
+    ("sanoma workflow", "sanoma.lib.workflow", ["pandas", "numpy", "matplotlib"]),
+    ("sanoma --server", "sanoma.lib.server", ["pandas", "numpy", "matplotlib"]),
+]
+
+
+def import_times(module):
+    """Import a module in a fresh interpreter and parse -X importtime output
+
+    Returns the cumulative microseconds of every imported module by name.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sanoma CLI startup")
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=150,
+        help="Maximum import time per entry point in milliseconds (default: 150)",
+    )
+    parser.add_argument(
+        "--runs", type=int, default=5, help="Runs per entry point; the best counts"
+    )
+    args = parser.parse_args()
+
+    failures = []
+    print(f"{'entry point':<18} {'import ms':>10}  heavy imports")
+    for label, module, forbidden in ENTRY_POINTS:
+        runs = [import_times(module) for _ in range(args.runs)]
+        milliseconds = min(times[module] for times in runs) / 1000
+        heavy = sorted(name for name in forbidden if name in runs[0])
+        print(f"{label:<18} {milliseconds:>10.1f}  {', '.join(heavy) or '-'}")
+        if milliseconds > args.budget_ms:
+            failures.append(f"{label} took {milliseconds:.1f}ms > {args.budget_ms}ms")
+        if heavy:
+            failures.append(f"{label} eagerly imports {', '.join(heavy)}")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Sender burst and change-point detection over daily per-domain counts
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from sanoma.lib.cube import load_counts
+from sanoma.lib.dates import add_date_range_arguments, date_window
+from sanoma.lib.domains import with_registrable_domain
+from sanoma.lib.output import write_data
+
+
+def daily_matrix(emails, column="from_domain", min_emails=20):
+    """Build a domains x days count matrix for domains with enough mail
+
+    Returns the domain names, the matrix and the date of its first column.
+    Works on raw datasets and count cubes alike through the count column.
+    """
+    days = pd.to_datetime(
+        emails["date"].astype(str).str.slice(0, 10), format="%Y-%m-%d", errors="coerce"
+    )
+    valid = days.notna().to_numpy()
+    if not valid.any():
+        return [], np.zeros((0, 0)), None
+    day_numbers = days[valid].to_numpy().astype("datetime64[D]").astype(np.int64)
+    counts = emails["count"].to_numpy(dtype=float)[valid]
+    codes, domains = emails[column].astype(str)[valid].factorize()
+
+    # Drop quiet domains before allocating the matrix.
+    totals = np.bincount(codes, weights=counts, minlength=len(domains))
+    kept = np.flatnonzero(totals >= min_emails)
+    remap = np.full(len(domains), -1)
+    remap[kept] = np.arange(len(kept))
+    rows = remap[codes]
+    selected = rows >= 0
+
+    first = int(day_numbers.min())
+    span = int(day_numbers.max()) - first + 1
+    cells = rows[selected] * span + (day_numbers[selected] - first)
+    matrix = np.bincount(cells, weights=counts[selected], minlength=len(kept) * span)
+    start = np.datetime64(first, "D")
+    return [str(domains[code]) for code in kept], matrix.reshape(len(kept), span), start
+
+
+def prefix_sums(matrix):
+    """Get running sums with a leading zero column, so window sums are differences"""
+    sums = np.zeros((matrix.shape[0], matrix.shape[1] + 1))
+    np.cumsum(matrix, axis=1, out=sums[:, 1:])
+    return sums
+
+
+def rolling_z_scores(matrix, window=28):
+    """Score each day against the mean and deviation of the preceding window
+
+    Window sums come from prefix-sum differences, so the cost is linear in
+    days x domains regardless of window length. Deviations are floored at
+    one email so near-silent senders don't produce infinite scores. Columns
+    start at day ``window``.
+    """
+    sums = prefix_sums(matrix)
+    squares = prefix_sums(matrix * matrix)
+    days = matrix.shape[1]
+    mean = (sums[:, window:days] - sums[:, : days - window]) / window
+    mean_square = (squares[:, window:days] - squares[:, : days - window]) / window
+    std = np.sqrt(np.maximum(mean_square - mean * mean, 0.0))
+    z_scores = (matrix[:, window:] - mean) / np.maximum(std, 1.0)
+    return z_scores, mean, std
+
+
+def find_bursts(domains, matrix, start, window=28, threshold=4.0):
+    """Group consecutive days scoring above threshold into bursts per domain"""
+    z_scores, mean, std = rolling_z_scores(matrix, window)
+    flagged = np.zeros((z_scores.shape[0], z_scores.shape[1] + 2), dtype=np.int8)
+    flagged[:, 1:-1] = z_scores >= threshold
+    edges = np.diff(flagged, axis=1)
+    # Row-major order pairs each run start with its end.
+    run_rows, run_starts = np.nonzero(edges == 1)
+    _, run_ends = np.nonzero(edges == -1)
+    sums = prefix_sums(matrix)
+
+    bursts = []
+    for row, first, last in zip(run_rows, run_starts, run_ends):
+        peak = first + int(np.argmax(z_scores[row, first:last]))
+        bursts.append(
+            {
+                "domain": domains[row],
+                "start": str(start + window + first),
+                "end": str(start + window + last - 1),
+                "days": int(last - first),
+                "emails": int(sums[row, window + last] - sums[row, window + first]),
+                "peak_date": str(start + window + peak),
+                "peak_count": int(matrix[row, window + peak]),
+                "peak_z_score": float(z_scores[row, peak]),
+                "baseline_mean": float(mean[row, first]),
+                "baseline_std": float(std[row, first]),
+            }
+        )
+    bursts.sort(key=lambda burst: burst["peak_z_score"], reverse=True)
+    return bursts
+
+
+def find_change_points(domains, matrix, start):
+    """Find each domain's strongest shift in mean daily volume (CUSUM)
+
+    The split maximizes |S_t - t/n * S_n| over the cumulative sums. Scores
+    divide that by sigma * sqrt(n), with sigma estimated from day-to-day
+    differences so the shift itself doesn't inflate it; scores above about
+    1.36 are unlikely under a constant rate.
+    """
+    days = matrix.shape[1]
+    if days < 3:
+        return []
+    sums = prefix_sums(matrix)
+    total = sums[:, -1:]
+    splits = np.arange(1, days)
+    deviation = np.abs(sums[:, 1:days] - splits / days * total)
+    best = np.argmax(deviation, axis=1)
+    rows = np.arange(matrix.shape[0])
+    split = splits[best]
+    before = sums[rows, split] / split
+    after = (total[:, 0] - sums[rows, split]) / (days - split)
+    sigma = np.sqrt(np.mean(np.diff(matrix, axis=1) ** 2, axis=1) / 2)
+    scores = deviation[rows, best] / (np.maximum(sigma, 1e-9) * np.sqrt(days))
+
+    change_points = [
+        {
+            "domain": domains[row],
+            "date": str(start + int(split[row])),
+            "mean_before": float(before[row]),
+            "mean_after": float(after[row]),
+            "score": float(scores[row]),
+        }
+        for row in rows
+        if sigma[row] > 0
+    ]
+    change_points.sort(key=lambda point: point["score"], reverse=True)
+    return change_points
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Detect sender bursts and volume change points"
+    )
+    parser.add_argument("input_file", help="Input dataset or count cube file")
+    parser.add_argument(
+        "--window",
+        type=int,
+        default=28,
+        help="Days in the rolling baseline (default: 28)",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=4.0,
+        help="Z-score that flags a burst day (default: 4.0)",
+    )
+    parser.add_argument(
+        "--min-emails",
+        type=int,
+        default=20,
+        help="Skip domains with fewer emails in total (default: 20)",
+    )
+    parser.add_argument(
+        "--top", type=int, default=20, help="Anomalies to report (default: 20)"
+    )
+    parser.add_argument(
+        "--rollup",
+        action="store_true",
+        help="Roll subdomains up to registrable domains (mail.x.com -> x.com)",
+    )
+    parser.add_argument("--output", help="Output file for anomalies")
+    add_date_range_arguments(parser)
+
+    args = parser.parse_args(argv)
+
+    emails = load_counts(args.input_file, {"date", "from_domain"})
+    emails = date_window(emails, args.since, args.until)
+    column = "from_domain"
+    if args.rollup:
+        emails = with_registrable_domain(emails)
+        column = "registrable_domain"
+
+    domains, matrix, start = daily_matrix(emails, column, args.min_emails)
+    bursts = []
+    change_points = []
+    if domains and matrix.shape[1] > args.window:
+        bursts = find_bursts(domains, matrix, start, args.window, args.threshold)
+        change_points = find_change_points(domains, matrix, start)
+
+    anomalies = {
+        "parameters": {
+            "window": args.window,
+            "threshold": args.threshold,
+            "min_emails": args.min_emails,
+            "domains": len(domains),
+            "days": int(matrix.shape[1]),
+        },
+        "bursts": bursts[: args.top],
+        "change_points": change_points[: args.top],
+    }
+
+    if args.output:
+        format_used = write_data(anomalies, args.output, "json")
+        print(f"Anomalies saved to {args.output} ({format_used})")
+    else:
+        print(f"Bursts (z >= {args.threshold}, {args.window}-day baseline):")
+        for burst in anomalies["bursts"]:
+            print(
+                f"  {burst['domain']:<30} {burst['start']} to {burst['end']} "
+                f"{burst['emails']:>5} emails (peak z {burst['peak_z_score']:.1f})"
+            )
+        print("\nChange points:")
+        for point in anomalies["change_points"]:
+            print(
+                f"  {point['domain']:<30} {point['date']} "
+                f"{point['mean_before']:.2f} -> {point['mean_after']:.2f}/day "
+                f"(score {point['score']:.2f})"
+            )
+
+
+if __name__ == "__main__":
+    main()
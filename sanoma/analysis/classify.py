@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Folder-trained multinomial naive Bayes scoring over cached text features
+"""
+
+import argparse
+
+import numpy as np
+
+from sanoma.lib.dates import add_date_range_arguments
+from sanoma.lib.features import HASH_BITS, load_features, row_ids
+from sanoma.lib.output import write_data
+
+
+def class_log_probabilities(features, rows, alpha=1.0, size=1 << HASH_BITS):
+    """Get smoothed log P(feature | class) from the given training rows"""
+    entries = np.isin(row_ids(features), rows)
+    counts = np.bincount(
+        features["indices"][entries],
+        weights=features["data"][entries],
+        minlength=size,
+    )
+    return np.log(counts + alpha) - np.log(counts.sum() + alpha * size)
+
+
+def train_naive_bayes(features, positive_rows, negative_rows, alpha=1.0):
+    """Train a two-class multinomial naive Bayes model
+
+    Returns per-feature log-likelihood ratios and the prior log-odds.
+    """
+    weights = class_log_probabilities(
+        features, positive_rows, alpha
+    ) - class_log_probabilities(features, negative_rows, alpha)
+    prior = np.log(len(positive_rows)) - np.log(len(negative_rows))
+    return weights, prior
+
+
+def score_messages(features, weights, prior):
+    """Score every message's positive-class log-odds in one vectorized pass"""
+    rows = len(features["indptr"]) - 1
+    contributions = features["data"] * weights[features["indices"]]
+    return prior + np.bincount(row_ids(features), contributions, minlength=rows)
+
+
+def evaluate(scores, positive_rows, negative_rows):
+    """Measure accuracy, precision and recall on held-out labeled rows"""
+    predicted_positive = scores[positive_rows] > 0
+    predicted_negative = scores[negative_rows] > 0
+    true_positive = int(predicted_positive.sum())
+    false_positive = int(predicted_negative.sum())
+    total = len(positive_rows) + len(negative_rows)
+    correct = true_positive + len(negative_rows) - false_positive
+    return {
+        "held_out": total,
+        "accuracy": correct / total if total else 0.0,
+        "precision": (
+            true_positive / (true_positive + false_positive)
+            if true_positive + false_positive
+            else 0.0
+        ),
+        "recall": true_positive / len(positive_rows) if len(positive_rows) else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Train a folder-labeled naive Bayes classifier and score emails"
+    )
+    parser.add_argument("input_file", help="Input dataset file")
+    parser.add_argument(
+        "--positive",
+        nargs="+",
+        default=["Junk"],
+        help="Folders labeling the positive class, in any case (default: Junk)",
+    )
+    parser.add_argument(
+        "--negative",
+        nargs="+",
+        default=["Inbox"],
+        help="Folders labeling the negative class, in any case (default: Inbox)",
+    )
+    parser.add_argument(
+        "--holdout",
+        type=float,
+        default=0.2,
+        help="Share of labeled emails held out for evaluation (default: 0.2)",
+    )
+    parser.add_argument(
+        "--alpha", type=float, default=1.0, help="Additive smoothing (default: 1.0)"
+    )
+    parser.add_argument(
+        "--top", type=int, default=20, help="Top unlabeled emails to list (default: 20)"
+    )
+    parser.add_argument("--output", help="Output file for the classification report")
+    parser.add_argument(
+        "--assign-output",
+        help="Write the dataset with a score column (positive-class log-odds)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default="cache/features",
+        help="Directory for cached feature matrices (default: cache/features)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Rebuild features without reading or writing the cache",
+    )
+    add_date_range_arguments(parser)
+
+    args = parser.parse_args(argv)
+
+    cache_dir = None if args.no_cache else args.cache_dir
+    emails, features = load_features(
+        args.input_file, cache_dir, args.since, args.until, columns={"folder"}
+    )
+    folders = emails["folder"].fillna("").astype(str)
+    # Folder names match case-insensitively, like ignore_folders in config.
+    folder_keys = folders.str.lower()
+    positive_keys = [folder.lower() for folder in args.positive]
+    negative_keys = [folder.lower() for folder in args.negative]
+    positive = np.flatnonzero(folder_keys.isin(positive_keys).to_numpy())
+    negative = np.flatnonzero(folder_keys.isin(negative_keys).to_numpy())
+    if not len(positive) or not len(negative):
+        raise ValueError("Both classes need at least one email in the given folders")
+
+    # Deterministic hold-out split of each class.
+    rng = np.random.default_rng(0)
+    held_positive = rng.random(len(positive)) < args.holdout
+    held_negative = rng.random(len(negative)) < args.holdout
+    weights, prior = train_naive_bayes(
+        features, positive[~held_positive], negative[~held_negative], args.alpha
+    )
+    scores = score_messages(features, weights, prior)
+
+    unlabeled = np.flatnonzero(
+        ~folder_keys.isin(positive_keys + negative_keys).to_numpy()
+    )
+    ranked = unlabeled[np.argsort(-scores[unlabeled], kind="stable")][: args.top]
+    report = {
+        "positive_folders": args.positive,
+        "negative_folders": args.negative,
+        "trained_on": {
+            "positive": int((~held_positive).sum()),
+            "negative": int((~held_negative).sum()),
+        },
+        "evaluation": evaluate(
+            scores, positive[held_positive], negative[held_negative]
+        ),
+        "scored_emails": len(scores),
+        "predicted_positive": int((scores > 0).sum()),
+        "top_unlabeled": [
+            {
+                "date": str(emails["date"].iloc[row]),
+                "folder": folders.iloc[row],
+                "subject": str(emails["subject"].iloc[row]),
+                "score": float(scores[row]),
+            }
+            for row in ranked
+        ],
+    }
+
+    if args.assign_output:
+        format_used = write_data(
+            emails.assign(score=scores).to_dict(orient="records"),
+            args.assign_output,
+            "json",
+        )
+        print(f"Dataset with scores saved to {args.assign_output} ({format_used})")
+
+    if args.output:
+        format_used = write_data(report, args.output, "json")
+        print(f"Classification report saved to {args.output} ({format_used})")
+    else:
+        evaluation = report["evaluation"]
+        print(
+            f"Naive Bayes ({', '.join(args.positive)} vs {', '.join(args.negative)}):"
+        )
+        print(
+            f"  Held-out accuracy: {evaluation['accuracy']:.1%} "
+            f"(precision {evaluation['precision']:.1%}, "
+            f"recall {evaluation['recall']:.1%}, n={evaluation['held_out']})"
+        )
+        print(
+            f"  Predicted {', '.join(args.positive)}: "
+            f"{report['predicted_positive']}/{report['scored_emails']} emails"
+        )
+        print("\nMost likely unlabeled emails:")
+        for row in report["top_unlabeled"]:
+            print(f"  {row['score']:>8.2f}  [{row['folder']}] {row['subject'][:60]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate clustering of templated mail with MinHash and LSH banding
+"""
+
+import argparse
+import hashlib
+import os
+import zlib
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from sanoma.lib.dataset import load_emails
+from sanoma.lib.dates import add_date_range_arguments, date_window
+from sanoma.lib.output import write_data
+
+SIGNATURE_VERSION = 1
+SHINGLE_SIZE = 3
+# Odd multiplier that mixes token hashes into shingle hashes (mod 2**64).
+SHINGLE_MIX = np.uint64(0x9E3779B97F4A7C15)
+# Shingles hashed per batch when computing signatures, bounding memory.
+BATCH_SHINGLES = 50000
+
+
+def normalize_text(emails):
+    """Join subject and body, lowercased, with digit runs collapsed"""
+    text = (
+        emails["subject"].fillna("").astype(str)
+        + " "
+        + emails["body"].fillna("").astype(str)
+    )
+    return text.str.lower().str.replace(r"\d+", "0", regex=True)
+
+
+def shingle_hashes(texts):
+    """Hash word shingles of every text into one flat array
+
+    Returns the shingle hashes and, per text, the offset of its first
+    shingle. Texts shorter than SHINGLE_SIZE words use their single words.
+    """
+    tokens = texts.str.findall(r"\w+")
+    lengths = tokens.str.len().to_numpy()
+    words = tokens.explode().dropna()
+    codes, vocabulary = pd.factorize(words.to_numpy(dtype=object))
+    word_hashes = np.array(
+        [zlib.crc32(word.encode()) for word in vocabulary], dtype=np.uint64
+    )[codes]
+    owners = np.repeat(np.arange(len(lengths)), lengths)
+
+    shingles = word_hashes[: max(len(word_hashes) - SHINGLE_SIZE + 1, 0)].copy()
+    for offset in range(1, SHINGLE_SIZE):
+        shingles = shingles * SHINGLE_MIX + word_hashes[offset : offset + len(shingles)]
+    whole = owners[: len(shingles)] == owners[SHINGLE_SIZE - 1 :]
+    short = lengths[owners] < SHINGLE_SIZE
+
+    hashes = np.concatenate([shingles[whole], word_hashes[short]])
+    hash_owners = np.concatenate([owners[: len(shingles)][whole], owners[short]])
+    order = np.argsort(hash_owners, kind="stable")
+    hashes = hashes[order]
+    counts = np.bincount(hash_owners, minlength=len(lengths))
+    offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    return hashes, offsets, counts
+
+
+def permutations(num_perm, seed=1):
+    """Get multiply-shift hash parameters for num_perm MinHash permutations"""
+    rng = np.random.default_rng(seed)
+    multipliers = rng.integers(1, 2**63, size=num_perm, dtype=np.uint64) * 2 + 1
+    offsets = rng.integers(0, 2**63, size=num_perm, dtype=np.uint64)
+    return multipliers, offsets
+
+
+def minhash_signatures(texts, num_perm=128):
+    """Compute MinHash signatures (uint32) of normalized texts
+
+    Shingles of many texts are hashed together in batches and reduced per
+    text with numpy.minimum.reduceat. Texts without shingles get an all-max
+    signature and are reported in the returned ``empty`` mask.
+    """
+    hashes, offsets, counts = shingle_hashes(texts)
+    multipliers, shifts = permutations(num_perm)
+    signatures = np.full((len(counts), num_perm), np.iinfo(np.uint32).max, np.uint32)
+    empty = counts == 0
+    filled = np.flatnonzero(~empty)
+
+    totals = np.cumsum(counts[filled])
+    start = 0
+    while start < len(filled):
+        # Take whole texts until the batch holds about BATCH_SHINGLES shingles.
+        done = totals[start - 1] if start else 0
+        stop = max(int(np.searchsorted(totals, done + BATCH_SHINGLES)), start + 1)
+        batch = filled[start:stop]
+        first = offsets[batch[0]]
+        last = offsets[batch[-1]] + counts[batch[-1]]
+        values = (
+            multipliers[:, None] * hashes[None, first:last] + shifts[:, None]
+        ) >> (np.uint64(32))
+        signatures[batch] = np.minimum.reduceat(
+            values, offsets[batch] - first, axis=1
+        ).T
+        start = stop
+    return signatures, empty
+
+
+def content_keys(texts):
+    """Key each normalized text by a 64-bit content hash"""
+    return pd.util.hash_pandas_object(texts, index=False).to_numpy()
+
+
+def signature_cache_path(cache_dir, num_perm):
+    """Get the signature cache file for a signature configuration"""
+    key = f"{SIGNATURE_VERSION}:{SHINGLE_SIZE}:{num_perm}"
+    return Path(cache_dir) / f"{hashlib.sha1(key.encode()).hexdigest()[:16]}.npz"
+
+
+def cached_signatures(texts, num_perm=128, cache_dir=None):
+    """Get signatures, computing only texts missing from the cache
+
+    The cache maps content hashes to signatures, so a rerun after new mail
+    arrives only shingles and hashes the new messages. It keeps only the
+    texts of the latest input.
+    """
+    keys = content_keys(texts)
+    path = signature_cache_path(cache_dir, num_perm) if cache_dir else None
+    cached_keys = np.zeros(0, dtype=np.uint64)
+    cached = np.zeros((0, num_perm), dtype=np.uint32)
+    if path:
+        try:
+            with np.load(path) as stored:
+                cached_keys, cached = stored["keys"], stored["signatures"]
+        except (OSError, KeyError, ValueError):
+            pass
+
+    position = np.searchsorted(cached_keys, keys)
+    position = np.minimum(position, max(len(cached_keys) - 1, 0))
+    hit = (
+        cached_keys[position] == keys if len(cached_keys) else np.zeros(len(keys), bool)
+    )
+    signatures = np.zeros((len(keys), num_perm), dtype=np.uint32)
+    signatures[hit] = cached[position[hit]]
+
+    missing = np.flatnonzero(~hit)
+    if path:
+        print(f"Reusing cached signatures for {int(hit.sum())}/{len(keys)} emails")
+    if len(missing):
+        signatures[missing], _ = minhash_signatures(texts.iloc[missing], num_perm)
+    # Signatures of texts no longer in the input are dropped, so the cache
+    # tracks the current dataset instead of growing with every change.
+    current = np.isin(cached_keys, keys)
+    if path and (len(missing) or not current.all()):
+        merged_keys, first = np.unique(
+            np.concatenate([cached_keys[current], keys[missing]]), return_index=True
+        )
+        merged = np.concatenate([cached[current], signatures[missing]])[first]
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_suffix(".tmp.npz")
+        np.savez(temp_path, keys=merged_keys, signatures=merged)
+        os.replace(temp_path, path)
+    return signatures
+
+
+def connected_components(size, sources, targets):
+    """Label connected components of an edge list by minimum member index"""
+    labels = np.arange(size)
+    while True:
+        previous = labels.copy()
+        low = np.minimum(labels[sources], labels[targets])
+        np.minimum.at(labels, sources, low)
+        np.minimum.at(labels, targets, low)
+        # Pointer jumping collapses chains of labels in a few rounds.
+        labels = labels[labels]
+        if np.array_equal(labels, previous):
+            return labels
+
+
+def lsh_clusters(signatures, usable, bands=16, threshold=0.8):
+    """Cluster signatures whose estimated Jaccard similarity reaches threshold
+
+    Each band's rows are bucketed with numpy.unique; members of a bucket are
+    linked to its first member when their signatures agree on at least
+    threshold of positions, so only candidate pairs are ever compared.
+    """
+    rows = signatures.shape[1] // bands
+    members = np.flatnonzero(usable)
+    sources = []
+    targets = []
+    for band in range(bands):
+        block = np.ascontiguousarray(
+            signatures[members, band * rows : (band + 1) * rows]
+        )
+        _, first, bucket = np.unique(
+            block.view(np.dtype((np.void, block.dtype.itemsize * rows))).ravel(),
+            return_index=True,
+            return_inverse=True,
+        )
+        leaders = first[bucket]
+        linked = leaders != np.arange(len(members))
+        sources.append(members[linked])
+        targets.append(members[leaders[linked]])
+    sources = np.concatenate(sources) if sources else np.zeros(0, dtype=np.int64)
+    targets = np.concatenate(targets) if targets else np.zeros(0, dtype=np.int64)
+
+    similarity = (signatures[sources] == signatures[targets]).mean(axis=1)
+    similar = similarity >= threshold
+    return connected_components(len(signatures), sources[similar], targets[similar])
+
+
+def cluster_ids(labels, min_size=2):
+    """Renumber component labels so cluster 0 is the largest, -1 unclustered"""
+    roots, inverse, sizes = np.unique(labels, return_inverse=True, return_counts=True)
+    ranked = np.lexsort((roots, -sizes))
+    rank = np.empty(len(roots), dtype=np.int64)
+    rank[ranked] = np.arange(len(roots))
+    ids = rank[inverse]
+    ids[sizes[inverse] < min_size] = -1
+    return ids
+
+
+def summarize_clusters(emails, ids, top=50):
+    """Describe clusters by size, date span, sample subject and main sender"""
+    sizes = np.bincount(ids[ids >= 0])
+    # Cluster ids are ranked by size, so the largest are 0 .. top - 1.
+    described = emails.assign(cluster_id=ids)[(ids >= 0) & (ids < top)]
+    grouped = described.groupby("cluster_id", sort=True)
+    dates = grouped["date"].agg(["min", "max"])
+    spans = pd.to_datetime(dates["max"], errors="coerce") - pd.to_datetime(
+        dates["min"], errors="coerce"
+    )
+    subjects = grouped["subject"].first()
+    senders = (
+        described.groupby(["cluster_id", "from_domain"])
+        .size()
+        .groupby(level=0)
+        .idxmax()
+    )
+    clusters = [
+        {
+            "cluster_id": int(cluster),
+            "size": int(sizes[cluster]),
+            "first_date": dates.loc[cluster, "min"],
+            "last_date": dates.loc[cluster, "max"],
+            "span_days": int(spans[cluster].days) if pd.notna(spans[cluster]) else 0,
+            "subject": subjects[cluster],
+            "from_domain": senders[cluster][1],
+        }
+        for cluster in dates.index
+    ]
+    return {
+        "summary": {
+            "emails": len(emails.index),
+            "clusters": int(len(sizes)),
+            "clustered_emails": int(sizes.sum()),
+        },
+        "clusters": clusters,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Near-duplicate email clustering")
+    parser.add_argument("input_file", help="Input dataset file")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.8,
+        help="Estimated Jaccard similarity that joins two emails (default: 0.8)",
+    )
+    parser.add_argument(
+        "--num-perm",
+        type=int,
+        default=128,
+        help="MinHash permutations per signature (default: 128)",
+    )
+    parser.add_argument("--bands", type=int, default=16, help="LSH bands (default: 16)")
+    parser.add_argument(
+        "--min-size", type=int, default=2, help="Smallest reported cluster (default: 2)"
+    )
+    parser.add_argument(
+        "--top", type=int, default=50, help="Clusters to describe (default: 50)"
+    )
+    parser.add_argument("--output", help="Output file for cluster summary")
+    parser.add_argument(
+        "--assign-output",
+        help="Write the dataset with a cluster_id column (-1 = unclustered)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default="cache/clusters",
+        help="Directory for cached signatures (default: cache/clusters)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Recompute all signatures without reading or writing the cache",
+    )
+    add_date_range_arguments(parser)
+
+    args = parser.parse_args(argv)
+    if args.num_perm % args.bands:
+        parser.error("--num-perm must be a multiple of --bands")
+
+    emails = load_emails(args.input_file, {"date", "subject", "body", "from_domain"})
+    emails = date_window(emails, args.since, args.until).reset_index(drop=True)
+    texts = normalize_text(emails)
+    cache_dir = None if args.no_cache else args.cache_dir
+    signatures = cached_signatures(texts, args.num_perm, cache_dir)
+    usable = texts.str.contains(r"\w", regex=True).to_numpy()
+
+    labels = lsh_clusters(signatures, usable, args.bands, args.threshold)
+    ids = cluster_ids(labels, args.min_size)
+    results = summarize_clusters(emails, ids, args.top)
+
+    if args.assign_output:
+        assigned = emails.assign(cluster_id=ids)
+        format_used = write_data(
+            assigned.to_dict(orient="records"), args.assign_output, "json"
+        )
+        print(f"Dataset with cluster ids saved to {args.assign_output} ({format_used})")
+
+    if args.output:
+        format_used = write_data(results, args.output, "json")
+        print(f"Cluster summary saved to {args.output} ({format_used})")
+    else:
+        summary = results["summary"]
+        print(
+            f"{summary['clustered_emails']}/{summary['emails']} emails in "
+            f"{summary['clusters']} near-duplicate clusters"
+        )
+        for cluster in results["clusters"]:
+            print(
+                f"  #{cluster['cluster_id']:<5} {cluster['size']:>6} emails "
+                f"{cluster['first_date'][:10]} to {cluster['last_date'][:10]}  "
+                f"{cluster['from_domain']:<25} {cluster['subject'][:40]}"
+            )
+
+
+if __name__ == "__main__":
+    main()
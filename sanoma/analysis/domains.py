@@ -7,42 +7,44 @@ import re
 import argparse
 from collections import Counter
 
+import numpy as np
 import pandas as pd
 
+from sanoma.lib.cube import is_cube, load_cube
+from sanoma.lib.dataset import iter_email_chunks, load_emails
+from sanoma.lib.dates import add_date_range_arguments, date_window
+from sanoma.lib.domains import domain_index, with_registrable_domain
 from sanoma.lib.output import write_data  # noqa: E402
+from sanoma.lib.prefilter import fold_case, format_skipped, prefiltered_contains
+from sanoma.lib.sketch import SpaceSaving, add_sketch_arguments
 
 
 def filter_emails_by_domain(emails, domain_pattern):
-    """Filter emails by sender domain pattern"""
-    from_domains = emails["from_domain"].astype(str)
-    if domain_pattern.startswith("*."):
-        suffix = domain_pattern[2:].lower()
-        mask = from_domains.str.lower().str.endswith(suffix, na=False)
-        return emails[mask]
-
-    # Allow regex-based domain matching.
-    domain_regex = re.compile(domain_pattern, re.IGNORECASE)
-    mask = from_domains.str.contains(domain_regex, na=False)
-    return emails[mask]
+    """Filter emails by sender domain pattern (wildcard suffix or regex)"""
+    return emails[domain_index(emails).mask(domain_pattern)]
 
 
-def get_pattern_emails(emails, pattern):
-    """Get emails containing pattern"""
-    combined = (
+def combined_text(emails):
+    """Join subject and body into the text that content patterns search"""
+    return (
         emails["subject"].fillna("").astype(str)
         + " "
         + emails["body"].fillna("").astype(str)
     )
-    mask = combined.str.contains(pattern, case=False, regex=True, na=False)
-    return emails[mask]
 
 
-def analyze_top_domains(emails, threshold=0.95):
-    """Find domains producing threshold% of pattern-matching emails"""
-    domain_counts = Counter(emails["from_domain"].astype(str))
-    total = len(emails.index)
+def get_pattern_emails(emails, pattern):
+    """Get emails containing pattern"""
+    combined = combined_text(emails)
+    mask, skipped = prefiltered_contains(combined, re.compile(pattern, re.IGNORECASE))
+    print(format_skipped(skipped, len(combined.index)))
+    return emails[mask]
+
 
-    sorted_domains = domain_counts.most_common()
+def coverage_curve(sorted_domains, threshold=0.95, total=None):
+    """Walk (domain, count) pairs, most common first, up to threshold coverage"""
+    if total is None:
+        total = sum(count for _, count in sorted_domains)
     cumulative = 0
     top_domains = []
 
@@ -63,10 +65,172 @@ def analyze_top_domains(emails, threshold=0.95):
         if cumulative_percentage >= threshold:
             break
 
-    return top_domains, cumulative / total
+    return top_domains, (cumulative / total if total else 0.0)
+
+
+def analyze_top_domains(emails, threshold=0.95, column="from_domain"):
+    """Find domains producing threshold% of pattern-matching emails
+
+    Rows with a ``count`` column (count cube cells) are weighted by it.
+    """
+    if "count" in emails.columns:
+        domain_counts = Counter()
+        for domain, count in zip(emails[column].astype(str), emails["count"]):
+            domain_counts[domain] += int(count)
+    else:
+        domain_counts = Counter(emails[column].astype(str))
+    return coverage_curve(domain_counts.most_common(), threshold)
+
+
+def approximate_top_domains(args, required_columns, domain_column):
+    """Stream the dataset in chunks, sketching pattern domains with Space-Saving
+
+    Counts in the returned top domains are upper bounds; each entry carries
+    the most its count may overestimate by. Chunk sketches merge, so partial
+    results from separate workers combine the same way.
+    """
+    regex = re.compile(args.pattern, re.IGNORECASE)
+    sketch = SpaceSaving(args.capacity)
+    compare_total = 0
+    compare_domains = set()
+    skipped = rows = 0
 
+    for chunk in iter_email_chunks(args.input_file, args.chunk_size, required_columns):
+        chunk = date_window(chunk, args.since, args.until)
+        if args.rollup:
+            chunk = with_registrable_domain(chunk)
+        mask, chunk_skipped = prefiltered_contains(combined_text(chunk), regex)
+        skipped += chunk_skipped
+        rows += len(chunk.index)
+        matched = chunk.loc[mask.to_numpy(), domain_column].astype(str)
+        sketch.merge(
+            SpaceSaving(args.capacity).update_counts(matched.value_counts(sort=False))
+        )
+
+        compare = filter_emails_by_domain(chunk, args.compare_pattern)
+        compare_total += len(compare.index)
+        compare_domains.update(compare[domain_column].astype(str))
+
+    print(format_skipped(skipped, rows))
+    ranked = sketch.top()
+    top_domains, coverage = coverage_curve(
+        [(domain, count) for domain, count, _ in ranked], args.threshold, sketch.total
+    )
+    for entry, (_, _, error) in zip(top_domains, ranked):
+        entry["error"] = error
+    return sketch.total, top_domains, coverage, compare_total, compare_domains
 
-def main():
+
+def build_pattern_matrix(emails, patterns, column="from_domain"):
+    """Count pattern-matching emails per sender domain for every pattern
+
+    The archive is loaded and case-folded once; each pattern then yields a
+    row mask that is binned by domain code. Returns the domain names, a
+    patterns x domains count matrix, and per pattern the domain codes in
+    order of first match (used to break count ties like Counter does).
+    """
+    codes, domains = emails[column].astype(str).factorize()
+    combined = combined_text(emails)
+    folded = fold_case(combined)
+
+    matrix = np.zeros((len(patterns), len(domains)), dtype=np.int64)
+    first_seen = []
+    skipped = 0
+    for row, pattern in enumerate(patterns):
+        mask, pattern_skipped = prefiltered_contains(
+            combined, re.compile(pattern, re.IGNORECASE), folded
+        )
+        skipped += pattern_skipped
+        matched = codes[mask.to_numpy()]
+        matrix[row] = np.bincount(matched, minlength=len(domains))
+        first_seen.append(pd.unique(matched))
+
+    print(format_skipped(skipped, len(combined.index) * len(patterns)))
+    return [str(domain) for domain in domains], matrix, first_seen
+
+
+def matrix_coverage(domains, counts, first_seen, threshold=0.95):
+    """Get the coverage curve for one pattern row of the count matrix"""
+    # Stable sort over first-match order reproduces Counter.most_common().
+    order = first_seen[np.argsort(-counts[first_seen], kind="stable")]
+    return coverage_curve(
+        [(domains[code], int(counts[code])) for code in order], threshold
+    )
+
+
+def pattern_coverage_table(patterns, domains, matrix, first_seen, compare, threshold):
+    """Flatten per-pattern coverage curves into one row per (pattern, domain)"""
+    rows = []
+    for row, pattern in enumerate(patterns):
+        top_domains, coverage = matrix_coverage(
+            domains, matrix[row], first_seen[row], threshold
+        )
+        for rank, info in enumerate(top_domains, 1):
+            rows.append(
+                {
+                    "pattern": pattern,
+                    "pattern_emails": int(matrix[row].sum()),
+                    "coverage": coverage,
+                    "rank": rank,
+                    "domain": info["domain"],
+                    "count": info["count"],
+                    "percentage": info["percentage"],
+                    "cumulative_percentage": info["cumulative_percentage"],
+                    "overlap": info["domain"] in compare,
+                }
+            )
+    return rows
+
+
+def matrix_rows(patterns, domains, matrix):
+    """Get the full count matrix as one row per domain, busiest first"""
+    totals = matrix.sum(axis=0)
+    rows = []
+    for code in np.argsort(-totals, kind="stable"):
+        if not totals[code]:
+            break
+        row = {"domain": domains[code]}
+        for index, pattern in enumerate(patterns):
+            row[pattern] = int(matrix[index, code])
+        rows.append(row)
+    return rows
+
+
+def report_pattern_matrix(args, emails_frame, domain_column):
+    """Analyze several content patterns against sender domains in one pass"""
+    domains, matrix, first_seen = build_pattern_matrix(
+        emails_frame, args.patterns, domain_column
+    )
+    compare_emails = filter_emails_by_domain(emails_frame, args.compare_pattern)
+    compare_domains = set(compare_emails[domain_column].astype(str))
+    table = pattern_coverage_table(
+        args.patterns, domains, matrix, first_seen, compare_domains, args.threshold
+    )
+
+    if args.matrix:
+        format_used = write_data(
+            matrix_rows(args.patterns, domains, matrix), args.matrix
+        )
+        print(f"Pattern x domain matrix saved to {args.matrix} ({format_used})")
+
+    if args.output:
+        format_used = write_data(table, args.output)
+        print(f"Coverage table saved to {args.output} ({format_used})")
+        return
+
+    print(f"Comparison with {args.compare_pattern}: {len(compare_emails)} emails")
+    print(f"\n{'pattern':<20} {'emails':>7} {'domains':>8} {'coverage':>9}  overlap")
+    for row, pattern in enumerate(args.patterns):
+        entries = [entry for entry in table if entry["pattern"] == pattern]
+        coverage = entries[0]["coverage"] if entries else 0.0
+        overlap = [entry["domain"] for entry in entries if entry["overlap"]]
+        print(
+            f"{pattern:<20} {int(matrix[row].sum()):>7} {len(entries):>8} "
+            f"{coverage * 100:>8.1f}%  {', '.join(overlap) or '-'}"
+        )
+
+
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Domain analysis for email patterns")
     parser.add_argument("input_file", help="Input dataset file")
     parser.add_argument(
@@ -74,50 +238,104 @@ def main():
     )
     parser.add_argument(
         "--pattern",
-        default="unsubscribe",
-        help="Email content pattern to analyze (default: unsubscribe)",
+        help="Email content pattern to analyze (default: unsubscribe, or every "
+        "email for a count cube)",
+    )
+    parser.add_argument(
+        "--patterns",
+        nargs="+",
+        metavar="PATTERN",
+        help="Analyze several content patterns in one pass (overrides --pattern)",
     )
     parser.add_argument("--output", help="Output file for analysis results")
+    parser.add_argument(
+        "--matrix",
+        help="With --patterns, also write the full pattern x domain count matrix",
+    )
     parser.add_argument(
         "--threshold",
         type=float,
         default=0.95,
         help="Coverage threshold (default: 0.95)",
     )
+    parser.add_argument(
+        "--rollup",
+        action="store_true",
+        help="Roll subdomains up to registrable domains (mail.x.com -> x.com)",
+    )
+    add_date_range_arguments(parser)
+    add_sketch_arguments(parser)
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
-    emails_frame = pd.read_json(args.input_file)
     required_columns = {"from_domain", "subject", "body"}
-    missing_columns = required_columns.difference(emails_frame.columns)
-    if missing_columns:
-        raise ValueError(
-            f"Missing required columns in JSON: {', '.join(sorted(missing_columns))}"
+    if args.since or args.until:
+        required_columns.add("date")
+    domain_column = "registrable_domain" if args.rollup else "from_domain"
+    from_cube = is_cube(args.input_file)
+    if args.pattern is None:
+        args.pattern = "" if from_cube else "unsubscribe"
+    if from_cube:
+        # Cubes carry no message text, so only the match-all pattern works.
+        if args.pattern or args.patterns or args.approximate:
+            parser.error(
+                "content patterns need the extracted dataset; "
+                "a count cube only gives overall sender volume (omit --pattern)"
+            )
+        emails_frame = load_cube(args.input_file, {"from_domain"})
+        emails_frame = date_window(emails_frame, args.since, args.until)
+        if args.rollup:
+            emails_frame = with_registrable_domain(emails_frame)
+        pattern_total = int(emails_frame["count"].sum())
+        top_domains, coverage = analyze_top_domains(
+            emails_frame, args.threshold, domain_column
         )
+        compare_emails = filter_emails_by_domain(emails_frame, args.compare_pattern)
+        compare_total = int(compare_emails["count"].sum())
+        compare_domains = set(compare_emails[domain_column].astype(str))
+    elif args.approximate:
+        if args.patterns:
+            parser.error("--approximate does not support --patterns")
+        pattern_total, top_domains, coverage, compare_total, compare_domains = (
+            approximate_top_domains(args, required_columns, domain_column)
+        )
+    else:
+        emails_frame = load_emails(args.input_file, required_columns)
+        emails_frame = date_window(emails_frame, args.since, args.until)
+        if args.rollup:
+            emails_frame = with_registrable_domain(emails_frame)
 
-    pattern_emails = get_pattern_emails(emails_frame, args.pattern)
-    top_domains, coverage = analyze_top_domains(pattern_emails, args.threshold)
+        if args.patterns:
+            report_pattern_matrix(args, emails_frame, domain_column)
+            return
 
-    compare_emails = filter_emails_by_domain(emails_frame, args.compare_pattern)
+        pattern_emails = get_pattern_emails(emails_frame, args.pattern)
+        pattern_total = len(pattern_emails.index)
+        top_domains, coverage = analyze_top_domains(
+            pattern_emails, args.threshold, domain_column
+        )
+
+        compare_emails = filter_emails_by_domain(emails_frame, args.compare_pattern)
+        compare_total = len(compare_emails.index)
+        compare_domains = set(compare_emails[domain_column].astype(str))
 
     # Prepare analysis results
     analysis_results = {
         "pattern_analysis": {
             "pattern": args.pattern,
-            "total_emails": int(pattern_emails.shape[0]),
+            "total_emails": pattern_total,
             "coverage_threshold": args.threshold,
             "actual_coverage": coverage,
             "top_domains": top_domains,
         },
         "comparison": {
             "pattern": args.compare_pattern,
-            "total_emails": int(compare_emails.shape[0]),
-            "domains": list(set(compare_emails["from_domain"].astype(str))),
+            "total_emails": compare_total,
+            "domains": list(compare_domains),
         },
     }
 
     # Find overlap
-    compare_domains = set(compare_emails["from_domain"].astype(str))
     top_domain_names = set(d["domain"] for d in top_domains)
     overlap = list(compare_domains.intersection(top_domain_names))
     analysis_results["overlap"] = overlap
@@ -128,16 +346,17 @@ def main():
     else:
         # Console output
         print(f"Pattern Analysis ('{args.pattern}'):")
-        print(f"  Total pattern emails: {len(pattern_emails)}")
+        print(f"  Total pattern emails: {pattern_total}")
         print(f"  Top domains cover {coverage*100:.1f}% of pattern volume:")
         for i, domain_info in enumerate(top_domains, 1):
             print(
                 f"    {i:2d}. {domain_info['domain']:<30} "
                 f"{domain_info['count']:>5} "
                 f"({domain_info['percentage']:>5.1f}%)"
+                + (f" +/- {domain_info['error']}" if domain_info.get("error") else "")
             )
         print(f"\nComparison with {args.compare_pattern}:")
-        print(f"  Total {args.compare_pattern} emails: {len(compare_emails)}")
+        print(f"  Total {args.compare_pattern} emails: {compare_total}")
         if overlap:
             print(f"  Overlap domains: {', '.join(overlap)}")
         else:
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Correspondence graph: who mails whom, as a CSR adjacency over address ids
+"""
+
+import argparse
+import hashlib
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from sanoma.lib.dataset import dataset_version, load_emails
+from sanoma.lib.dates import add_date_range_arguments, date_window
+from sanoma.lib.output import write_data
+
+GRAPH_VERSION = 1
+ADDRESS_PATTERN = r"[\w.+'-]+@[\w-]+(?:\.[\w-]+)+"
+GRAPH_ARRAYS = [
+    "addresses",
+    "sent",
+    "indptr",
+    "indices",
+    "counts",
+    "first_seen",
+    "last_seen",
+]
+
+
+def parse_edges(emails):
+    """Parse sender and recipient addresses into one row per delivery
+
+    Returns sender addresses, recipient addresses and timestamps (seconds
+    since epoch) of every sender -> recipient edge, plus each message's
+    sender. Self-addressed copies are dropped.
+    """
+    seconds = pd.to_datetime(
+        emails["date"].astype(str).str.slice(0, 19),
+        format="%Y-%m-%d %H:%M:%S",
+        errors="coerce",
+    )
+    senders = (
+        emails["from"]
+        .fillna("")
+        .astype(str)
+        .str.lower()
+        .str.extract(f"({ADDRESS_PATTERN})", expand=False)
+    )
+    valid = (senders.notna() & seconds.notna()).to_numpy()
+    senders = senders[valid]
+    seconds = seconds[valid].to_numpy().astype("datetime64[s]").astype(np.int64)
+
+    recipients = (
+        emails["to"][valid]
+        .fillna("")
+        .astype(str)
+        .str.lower()
+        .str.findall(ADDRESS_PATTERN)
+    )
+    per_message = recipients.str.len().to_numpy()
+    edge_senders = np.repeat(senders.to_numpy(dtype=object), per_message)
+    edge_recipients = recipients.explode().dropna().to_numpy(dtype=object)
+    edge_seconds = np.repeat(seconds, per_message)
+
+    distinct = edge_senders != edge_recipients
+    return (
+        edge_senders[distinct],
+        edge_recipients[distinct],
+        edge_seconds[distinct],
+        senders.to_numpy(dtype=object),
+    )
+
+
+def build_graph(emails):
+    """Intern addresses and build a CSR adjacency with edge statistics
+
+    Rows are senders and columns recipients. Each stored edge carries its
+    message count and first/last-seen timestamps; ``sent`` counts messages
+    per sender for fan-out ratios.
+    """
+    edge_senders, edge_recipients, edge_seconds, message_senders = parse_edges(emails)
+    codes, addresses = pd.factorize(
+        np.concatenate([edge_senders, edge_recipients, message_senders])
+    )
+    size = len(addresses)
+    edges = len(edge_senders)
+    sources = codes[:edges].astype(np.int64)
+    targets = codes[edges : 2 * edges].astype(np.int64)
+    sent = np.bincount(codes[2 * edges :], minlength=size)
+
+    # Sorting by (source, target, time) makes every edge a contiguous run.
+    order = np.lexsort((edge_seconds, targets, sources))
+    keys = sources[order] * size + targets[order]
+    seconds = edge_seconds[order]
+    starts = np.flatnonzero(np.diff(keys, prepend=-1))
+    ends = np.append(starts[1:], len(keys))
+    unique_keys = keys[starts]
+
+    return {
+        "addresses": np.asarray(addresses, dtype=str),
+        "sent": sent,
+        "indptr": np.concatenate(
+            ([0], np.cumsum(np.bincount(unique_keys // size, minlength=size)))
+        ),
+        "indices": unique_keys % size,
+        "counts": ends - starts,
+        "first_seen": seconds[starts],
+        "last_seen": seconds[ends - 1],
+    }
+
+
+def graph_cache_path(cache_dir, input_file, since=None, until=None):
+    """Get the cache file for a dataset and date window"""
+    key = f"{GRAPH_VERSION}:{Path(input_file).resolve()}:{since}:{until}"
+    return Path(cache_dir) / f"{hashlib.sha1(key.encode()).hexdigest()[:16]}.npz"
+
+
+def load_graph(path, version):
+    """Load a cached graph if it was built from this dataset version"""
+    try:
+        with np.load(path) as cached:
+            if str(cached["version"]) != version:
+                return None
+            return {name: cached[name] for name in GRAPH_ARRAYS}
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def save_graph(path, graph, version):
+    """Write a graph cache file atomically"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_suffix(".tmp.npz")
+    np.savez_compressed(temp_path, version=np.array(version), **graph)
+    os.replace(temp_path, path)
+
+
+def cached_graph(input_file, cache_dir=None, since=None, until=None):
+    """Build the graph for a dataset, reusing the cache if it is unchanged"""
+    version = dataset_version(input_file)
+    path = graph_cache_path(cache_dir, input_file, since, until) if cache_dir else None
+    if path:
+        graph = load_graph(path, version)
+        if graph is not None:
+            print(f"Reusing cached graph {path}")
+            return graph
+
+    columns = ["date", "from", "to"]
+    emails = load_emails(input_file, columns, columns)
+    emails = date_window(emails, since, until)
+    graph = build_graph(emails)
+    if path:
+        save_graph(path, graph, version)
+    return graph
+
+
+def edge_rows(graph, sources, positions):
+    """Describe edges at CSR positions as output rows"""
+    addresses = graph["addresses"]
+    return [
+        {
+            "from": str(addresses[source]),
+            "to": str(addresses[graph["indices"][position]]),
+            "emails": int(graph["counts"][position]),
+            "first_seen": str(np.datetime64(int(graph["first_seen"][position]), "s")),
+            "last_seen": str(np.datetime64(int(graph["last_seen"][position]), "s")),
+        }
+        for source, position in zip(sources, positions)
+    ]
+
+
+def edge_sources(graph):
+    """Get the source id of every stored edge"""
+    return np.repeat(np.arange(len(graph["addresses"])), np.diff(graph["indptr"]))
+
+
+def address_id(graph, address):
+    """Look up an address id, raising ValueError for unknown addresses"""
+    matches = np.flatnonzero(graph["addresses"] == address.lower())
+    if not len(matches):
+        raise ValueError(f"Address not found in graph: {address}")
+    return int(matches[0])
+
+
+def top_correspondents(graph, address=None, top=20):
+    """Get the busiest edges overall, or an address's busiest correspondents"""
+    counts = graph["counts"]
+    sources = edge_sources(graph)
+    if address is None:
+        ranked = np.argsort(-counts, kind="stable")[:top]
+        return {"edges": edge_rows(graph, sources[ranked], ranked)}
+
+    node = address_id(graph, address)
+    start, stop = graph["indptr"][node], graph["indptr"][node + 1]
+    outgoing = np.arange(start, stop)
+    outgoing = outgoing[np.argsort(-counts[outgoing], kind="stable")][:top]
+    incoming = np.flatnonzero(graph["indices"] == node)
+    incoming = incoming[np.argsort(-counts[incoming], kind="stable")][:top]
+    return {
+        "address": str(graph["addresses"][node]),
+        "sent_to": edge_rows(graph, sources[outgoing], outgoing),
+        "received_from": edge_rows(graph, sources[incoming], incoming),
+    }
+
+
+def reciprocity(graph, address=None, top=20):
+    """Measure how many edges are answered by an edge in the other direction"""
+    size = len(graph["addresses"])
+    sources = edge_sources(graph)
+    targets = graph["indices"]
+    # CSR order is sorted by (source, target), so keys are already sorted.
+    keys = sources * size + targets
+    reverse = targets * size + sources
+    found = np.searchsorted(keys, reverse)
+    found = np.minimum(found, max(len(keys) - 1, 0))
+    mutual = keys[found] == reverse if len(keys) else np.zeros(0, dtype=bool)
+    reverse_counts = np.where(mutual, graph["counts"][found], 0)
+
+    if address is None:
+        selected = np.ones(len(keys), dtype=bool)
+        # Each mutual pair appears twice; list it once, from the lower id.
+        listed = mutual & (sources < targets)
+    else:
+        selected = sources == address_id(graph, address)
+        listed = mutual & selected
+    pair_strength = np.minimum(graph["counts"], reverse_counts)
+    pairs = np.flatnonzero(listed)
+    pairs = pairs[np.argsort(-pair_strength[pairs], kind="stable")][:top]
+    addresses = graph["addresses"]
+    return {
+        "address": address,
+        "edges": int(selected.sum()),
+        "reciprocated_edges": int((mutual & selected).sum()),
+        "reciprocity": float((mutual & selected).sum() / max(selected.sum(), 1)),
+        "top_mutual_pairs": [
+            {
+                "a": str(addresses[sources[edge]]),
+                "b": str(addresses[targets[edge]]),
+                "a_to_b": int(graph["counts"][edge]),
+                "b_to_a": int(reverse_counts[edge]),
+            }
+            for edge in pairs
+        ],
+    }
+
+
+def fan_out(graph, top=20):
+    """Rank senders by distinct recipients, with deliveries per message"""
+    out_degree = np.diff(graph["indptr"])
+    in_degree = np.bincount(graph["indices"], minlength=len(out_degree))
+    deliveries = np.bincount(
+        edge_sources(graph), weights=graph["counts"], minlength=len(out_degree)
+    )
+    sent = graph["sent"]
+    ranked = np.lexsort((-deliveries, -out_degree))[:top]
+    return {
+        "senders": int((sent > 0).sum()),
+        "addresses": int(len(out_degree)),
+        "top_fan_out": [
+            {
+                "address": str(graph["addresses"][node]),
+                "distinct_recipients": int(out_degree[node]),
+                "distinct_senders": int(in_degree[node]),
+                "emails_sent": int(sent[node]),
+                "recipients_per_email": float(deliveries[node] / max(sent[node], 1)),
+            }
+            for node in ranked
+        ],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Correspondence graph analysis")
+    parser.add_argument("input_file", help="Input dataset file")
+    parser.add_argument(
+        "--query",
+        choices=["top", "reciprocity", "fanout"],
+        default="top",
+        help="Question to answer from the graph (default: top)",
+    )
+    parser.add_argument("--address", help="Restrict top/reciprocity to one address")
+    parser.add_argument(
+        "--top", type=int, default=20, help="Rows to report (default: 20)"
+    )
+    parser.add_argument("--output", help="Output file for query results")
+    parser.add_argument(
+        "--cache-dir",
+        default="cache/graph",
+        help="Directory for the persisted graph (default: cache/graph)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Rebuild the graph without reading or writing the cache",
+    )
+    add_date_range_arguments(parser)
+
+    args = parser.parse_args(argv)
+
+    cache_dir = None if args.no_cache else args.cache_dir
+    graph = cached_graph(args.input_file, cache_dir, args.since, args.until)
+
+    if args.query == "reciprocity":
+        results = reciprocity(graph, args.address, args.top)
+    elif args.query == "fanout":
+        results = fan_out(graph, args.top)
+    else:
+        results = top_correspondents(graph, args.address, args.top)
+
+    if args.output:
+        format_used = write_data(results, args.output, "json")
+        print(f"Graph {args.query} results saved to {args.output} ({format_used})")
+    elif args.query == "reciprocity":
+        print(
+            f"Reciprocity: {results['reciprocity']:.1%} "
+            f"({results['reciprocated_edges']}/{results['edges']} edges)"
+        )
+        for pair in results["top_mutual_pairs"]:
+            print(f"  {pair['a']} <-> {pair['b']}: {pair['a_to_b']}/{pair['b_to_a']}")
+    elif args.query == "fanout":
+        print(f"Fan-out ({results['senders']} senders):")
+        for row in results["top_fan_out"]:
+            print(
+                f"  {row['address']:<40} {row['distinct_recipients']:>5} recipients "
+                f"({row['recipients_per_email']:.1f} per email)"
+            )
+    else:
+        sections = ["edges"] if args.address is None else ["sent_to", "received_from"]
+        for section in sections:
+            print(f"{section.replace('_', ' ').capitalize()}:")
+            for edge in results[section]:
+                print(f"  {edge['from']} -> {edge['to']}: {edge['emails']}")
+
+
+if __name__ == "__main__":
+    main()
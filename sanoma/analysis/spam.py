@@ -5,97 +5,180 @@ Analyzes frequency of marketing/spam keywords over time
 """
 
 import argparse
+import base64
+import hashlib
+import multiprocessing
+import os
 import re
-from collections import defaultdict
-from datetime import datetime
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from itertools import repeat
+from pathlib import Path
 
 import json
+import numpy as np
 import pandas as pd
 
+from sanoma.lib.dataset import load_emails
+from sanoma.lib.dates import add_date_range_arguments, date_window
 from sanoma.lib.output import write_data
+from sanoma.lib.prefilter import fold_case, format_skipped, prefiltered_contains
+from sanoma.lib.progress import CHUNK_SIZE, Progress, text_bytes
+
+# Bump when match semantics change so cached counts are not reused.
+CACHE_VERSION = 1
+
+# Regex patterns matching common marketing/spam keywords
+# Each pattern targets a specific spam category using word boundaries (\b)
+# to match whole words only, with pipes (|) for alternatives
+DEFAULT_PATTERNS = {
+    "survey": r"\b(survey|questionnaire|feedback|review)\b",
+    "rate_us": r"\b(rate\s+us|rating|review\s+us|tell\s+us\s+what)\b",
+    "take_minutes": r"\b(take\s+\d+\s+minutes?|quick\s+survey|brief\s+survey)\b",
+    "satisfaction": r"\b(satisfaction|experience|service|how\s+did\s+we\s+do)\b",
+    "win_prizes": r"\b(win|prize|reward|gift\s+card|enter\s+to\s+win)\b",
+    "limited_time": r"\b(limited\s+time|expires|hurry|act\s+now|don't\s+miss)\b",
+    "unsubscribe_bait": r"\b(unsubscribe|opt\s+out|remove|preferences)\b",
+}
+
+
+def extract_date_components(emails):
+    """Extract year, month columns from the date column (NaN if unparsable)"""
+    dates = pd.to_datetime(
+        emails["date"].astype(str).str.slice(0, 19),
+        format="%Y-%m-%d %H:%M:%S",
+        errors="coerce",
+    )
+    return dates.dt.year, dates.dt.month
 
 
-def extract_date_components(date_str):
-    """Extract year, month from date string"""
-    try:
-        dt = datetime.strptime(date_str[:19], "%Y-%m-%d %H:%M:%S")
-        return dt.year, dt.month
-    except (ValueError, TypeError):
-        return None, None
-
+def check_spam_keywords(emails, keyword_patterns):
+    """Check every email for spam keywords, one boolean column per pattern
 
-def check_spam_keywords(subject, body, keyword_patterns):
-    """Check if email contains spam keywords"""
-    combined_text = f"{subject} {body}".lower()
+    Returns the match frame and the number of keyword checks the literal
+    prefilter ruled out without running the regex.
+    """
+    combined_text = (
+        emails["subject"].fillna("").astype(str)
+        + " "
+        + emails["body"].fillna("").astype(str)
+    ).str.lower()
+    folded_text = fold_case(combined_text)
 
-    matches = []
+    matches = {}
+    skipped = 0
     for pattern_name, pattern in keyword_patterns.items():
-        if re.search(pattern, combined_text, re.IGNORECASE):
-            matches.append(pattern_name)
+        regex = re.compile(pattern, re.IGNORECASE)
+        matches[pattern_name], pattern_skipped = prefiltered_contains(
+            combined_text, regex, folded_text
+        )
+        skipped += pattern_skipped
 
-    return matches
+    return pd.DataFrame(matches, index=emails.index, columns=list(matches)), skipped
 
 
-def analyze_spam_keywords(emails, keyword_patterns):
-    """Analyze spam keyword frequency over time"""
-    # Monthly data
-    monthly_data = defaultdict(
-        lambda: {
-            "total_emails": 0,
-            "spam_emails": 0,
-            "keyword_matches": defaultdict(int),
-            "spam_percentage": 0.0,
-        }
-    )
+def aggregate_spam_counts(keys, keyword_matches):
+    """Count totals, spam and per-keyword matches per key in one groupby
 
-    # Yearly data
-    yearly_data = defaultdict(
-        lambda: {
-            "total_emails": 0,
-            "spam_emails": 0,
-            "keyword_matches": defaultdict(int),
-            "spam_percentage": 0.0,
-        }
+    Groups keep first-appearance order so output follows the dataset order.
+    """
+    counts = keyword_matches.astype(int).assign(
+        total_emails=1, spam_emails=keyword_matches.any(axis=1).astype(int)
+    )
+    columns = ["total_emails", "spam_emails", *keyword_matches.columns]
+    return counts[columns].groupby(keys, sort=False).sum()
+
+
+def analyze_chunk(emails, keys, keyword_patterns):
+    """Match and count one chunk of emails (runs in worker processes)"""
+    keyword_matches, skipped = check_spam_keywords(emails, keyword_patterns)
+    return aggregate_spam_counts(keys, keyword_matches), keyword_matches, skipped
+
+
+def analyze_chunks(emails, keys, keyword_patterns, jobs=1):
+    """Analyze emails in chunks, optionally across worker processes
+
+    Each chunk yields partial monthly counts for a contiguous span of rows.
+    Merging partials in chunk order keeps first-appearance month order, so
+    the result does not depend on the chunking. Progress is reported as
+    chunks complete. Returns the merged monthly counts, the match frame and
+    the number of prefilter-skipped keyword checks.
+    """
+    keys = np.asarray(keys)
+    rows = len(emails.index)
+    parallel = jobs > 1 and rows >= 2 * jobs
+    if parallel:
+        # Several chunks per worker keep the pool busy when chunk costs differ.
+        bounds = np.linspace(0, rows, jobs * 4 + 1).astype(int)
+        spans = list(zip(bounds[:-1], bounds[1:]))
+    else:
+        spans = [
+            (start, min(start + CHUNK_SIZE, rows))
+            for start in range(0, max(rows, 1), CHUNK_SIZE)
+        ]
+    chunks = (
+        [emails.iloc[start:stop] for start, stop in spans],
+        [keys[start:stop] for start, stop in spans],
+        repeat(keyword_patterns, len(spans)),
     )
 
-    total_processed = 0
-    total_spam = 0
-
-    for email in emails.itertuples(index=False):
-        year, month = extract_date_components(str(email.date))
-        if not year:
-            continue
-
-        month_key = f"{year}-{month:02d}"
-
-        # Count total emails
-        monthly_data[month_key]["total_emails"] += 1
-        yearly_data[year]["total_emails"] += 1
-        total_processed += 1
-
-        # Check for spam keywords
-        spam_matches = check_spam_keywords(
-            str(email.subject), str(email.body), keyword_patterns
+    results = []
+    # Spawned workers stay safe when the caller is a threaded workflow runner.
+    executor = (
+        ProcessPoolExecutor(
+            max_workers=jobs, mp_context=multiprocessing.get_context("spawn")
         )
+        if parallel
+        else nullcontext()
+    )
+    with executor as pool, Progress("Matching keywords", rows) as progress:
+        mapper = pool.map if parallel else map
+        for chunk, result in zip(chunks[0], mapper(analyze_chunk, *chunks)):
+            results.append(result)
+            progress.update(
+                len(chunk.index), text_bytes(chunk["subject"], chunk["body"])
+            )
+
+    if len(results) == 1:
+        return results[0]
+    partial_counts = pd.concat([counts for counts, _, _ in results])
+    monthly_counts = partial_counts.groupby(level=0, sort=False).sum()
+    keyword_matches = pd.concat([matches for _, matches, _ in results])
+    skipped = sum(chunk_skipped for _, _, chunk_skipped in results)
+    return monthly_counts, keyword_matches, skipped
+
+
+def build_period_data(counts, keyword_names):
+    """Convert aggregated count rows into the per-period output structure"""
+    period_data = {}
+    for key, row in zip(counts.index, counts.itertuples(index=False)):
+        total_emails = int(row[0])
+        spam_emails = int(row[1])
+        keyword_counts = zip(keyword_names, row[2:])
+        period_data[key] = {
+            "total_emails": total_emails,
+            "spam_emails": spam_emails,
+            "keyword_matches": {k: int(c) for k, c in keyword_counts if c > 0},
+            "spam_percentage": (
+                (spam_emails / total_emails) * 100 if total_emails > 0 else 0.0
+            ),
+        }
+    return period_data
 
-        if spam_matches:
-            monthly_data[month_key]["spam_emails"] += 1
-            yearly_data[year]["spam_emails"] += 1
-            total_spam += 1
 
-            # Track which keywords matched
-            for keyword in spam_matches:
-                monthly_data[month_key]["keyword_matches"][keyword] += 1
-                yearly_data[year]["keyword_matches"][keyword] += 1
+def build_spam_analysis(monthly_counts, keyword_patterns):
+    """Build summary, by_month and by_year sections from monthly counts
 
-    # Calculate percentages
-    for data in monthly_data.values():
-        if data["total_emails"] > 0:
-            data["spam_percentage"] = (data["spam_emails"] / data["total_emails"]) * 100
+    monthly_counts is indexed by "YYYY-MM" keys in first-appearance order.
+    """
+    keyword_names = list(keyword_patterns)
+    years = monthly_counts.index.str.slice(0, 4).astype(int)
+    yearly_counts = monthly_counts.groupby(years, sort=False).sum()
+    yearly_counts.index = [int(year) for year in yearly_counts.index]
 
-    for data in yearly_data.values():
-        if data["total_emails"] > 0:
-            data["spam_percentage"] = (data["spam_emails"] / data["total_emails"]) * 100
+    total_processed = int(monthly_counts["total_emails"].sum())
+    total_spam = int(monthly_counts["spam_emails"].sum())
 
     return {
         "summary": {
@@ -106,33 +189,244 @@ def analyze_spam_keywords(emails, keyword_patterns):
             ),
             "keyword_patterns": keyword_patterns,
         },
-        "by_month": dict(monthly_data),
-        "by_year": dict(yearly_data),
+        "by_month": build_period_data(monthly_counts, keyword_names),
+        "by_year": build_period_data(yearly_counts, keyword_names),
     }
 
 
-def main():
+def month_keys(years, months):
+    """Format year/month columns as "YYYY-MM" keys"""
+    return (
+        years.astype(int).astype(str)
+        + "-"
+        + months.astype(int).astype(str).str.zfill(2)
+    )
+
+
+def pattern_hash(pattern):
+    """Hash a single keyword pattern for its match-column cache"""
+    key = f"{CACHE_VERSION}:{pattern}"
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+def pattern_set_hash(keyword_patterns):
+    """Hash a named pattern set for its monthly aggregate cache"""
+    key = json.dumps([CACHE_VERSION, keyword_patterns], sort_keys=True)
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+def month_fingerprints(emails, keys):
+    """Get row positions and a content fingerprint for every month
+
+    Months are returned in first-appearance order. A fingerprint changes when
+    any row of the month is added, removed, reordered or edited.
+    """
+    row_hashes = pd.util.hash_pandas_object(
+        emails[["date", "subject", "body"]], index=False
+    ).to_numpy()
+    positions = keys.groupby(keys.to_numpy()).indices
+    months = {}
+    for key in keys.unique():
+        digest = hashlib.blake2b(row_hashes[positions[key]].tobytes(), digest_size=16)
+        months[key] = (positions[key], digest.hexdigest())
+    return months
+
+
+def load_cache(path):
+    """Load a JSON cache file, treating missing or corrupt files as empty"""
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(path, data):
+    """Write a JSON cache file atomically
+
+    Each writer gets its own temp file, so concurrent steps sharing a cache
+    directory never interleave writes; the last rename wins.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(
+        f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+    )
+    with open(temp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(temp_path, path)
+
+
+def pack_matches(matches):
+    """Pack a boolean match array into a base64 bitmap"""
+    return base64.b64encode(np.packbits(matches).tobytes()).decode("ascii")
+
+
+def unpack_matches(packed, count):
+    """Unpack a base64 bitmap into a boolean match array"""
+    bits = np.frombuffer(base64.b64decode(packed), dtype=np.uint8)
+    return np.unpackbits(bits, count=count).astype(bool)
+
+
+def count_months_incremental(emails, keys, keyword_patterns, cache_dir, jobs=1):
+    """Count spam per month, reusing cached months and match columns
+
+    Monthly aggregates are cached per pattern set and reused for months whose
+    rows are unchanged. Other months (new mail, edited rows, or a changed
+    pattern set) are rebuilt from per-pattern match columns, and only the
+    columns without a cached bitmap for that month run their regex.
+    """
+    cache_dir = Path(cache_dir)
+    emails = emails.reset_index(drop=True)
+    keys = keys.reset_index(drop=True)
+    months = month_fingerprints(emails, keys)
+    keyword_names = list(keyword_patterns)
+
+    set_path = cache_dir / f"{pattern_set_hash(keyword_patterns)}.json"
+    cached_months = load_cache(set_path).get("months", {})
+    reused = {
+        key: cached_months[key]
+        for key, (_, fingerprint) in months.items()
+        if cached_months.get(key, {}).get("fingerprint") == fingerprint
+    }
+    dirty = [key for key in months if key not in reused]
+    print(f"Reusing cached counts for {len(reused)}/{len(months)} months")
+
+    # Fill match columns for dirty months from cached bitmaps where possible.
+    columns = {}
+    column_caches = {}
+    pending = {}
+    for name, pattern in keyword_patterns.items():
+        column_path = cache_dir / "columns" / f"{pattern_hash(pattern)}.json"
+        column_cache = load_cache(column_path).get("months", {})
+        column_caches[name] = (column_path, column_cache)
+        column = np.zeros(len(emails.index), dtype=bool)
+        missing = []
+        for key in dirty:
+            rows, fingerprint = months[key]
+            entry = column_cache.get(key, {})
+            if entry.get("fingerprint") == fingerprint:
+                column[rows] = unpack_matches(entry["matches"], len(rows))
+            else:
+                missing.append(key)
+        columns[name] = column
+        if missing:
+            pending.setdefault(tuple(missing), {})[name] = pattern
+
+    # Run the regexes, batching patterns that need the same months.
+    for missing, patterns in pending.items():
+        rows = np.concatenate([months[key][0] for key in missing])
+        _, matches, skipped = analyze_chunks(
+            emails.iloc[rows], keys.iloc[rows], patterns, jobs
+        )
+        print(format_skipped(skipped, len(rows) * len(patterns), "keyword checks"))
+        for name in patterns:
+            columns[name][rows] = matches[name].to_numpy()
+
+    monthly_counts = pd.DataFrame(
+        [
+            [entry["total_emails"], entry["spam_emails"]]
+            + [entry["keyword_matches"].get(name, 0) for name in keyword_names]
+            for entry in reused.values()
+        ],
+        index=list(reused),
+        columns=["total_emails", "spam_emails", *keyword_names],
+    )
+    if dirty:
+        rows = np.concatenate([months[key][0] for key in dirty])
+        keyword_matches = pd.DataFrame(
+            {name: columns[name][rows] for name in keyword_names},
+            columns=keyword_names,
+        )
+        dirty_counts = aggregate_spam_counts(
+            keys.iloc[rows].to_numpy(), keyword_matches
+        )
+        monthly_counts = pd.concat([monthly_counts, dirty_counts])
+    monthly_counts = monthly_counts.reindex(list(months)).astype(int)
+
+    # Merge rebuilt months into the caches. Months outside this input (another
+    # date window or a filtered dataset) stay cached for later runs; a month
+    # is only replaced when its rows changed.
+    for name in keyword_names:
+        column_path, column_cache = column_caches[name]
+        updated = dict(column_cache)
+        for key in dirty:
+            rows, fingerprint = months[key]
+            updated[key] = {
+                "fingerprint": fingerprint,
+                "matches": pack_matches(columns[name][rows]),
+            }
+        save_cache(column_path, {"pattern": keyword_patterns[name], "months": updated})
+
+    updated_months = dict(cached_months)
+    for key, row in zip(monthly_counts.index, monthly_counts.itertuples()):
+        updated_months[key] = {
+            "fingerprint": months[key][1],
+            "total_emails": int(row.total_emails),
+            "spam_emails": int(row.spam_emails),
+            "keyword_matches": {
+                name: int(count) for name, count in zip(keyword_names, row[3:])
+            },
+        }
+    save_cache(
+        set_path, {"keyword_patterns": keyword_patterns, "months": updated_months}
+    )
+    return monthly_counts
+
+
+def analyze_spam_keywords(emails, keyword_patterns, cache_dir=None, jobs=1):
+    """Analyze spam keyword frequency over time
+
+    With cache_dir, per-month aggregates and per-pattern match columns are
+    kept between runs so only new or changed months are re-analyzed. With
+    jobs > 1, keyword matching is split across that many worker processes.
+    """
+    years, months = extract_date_components(emails)
+    dated = years.notna()
+    emails = emails[dated]
+    keys = month_keys(years[dated], months[dated])
+
+    if cache_dir:
+        monthly_counts = count_months_incremental(
+            emails, keys, keyword_patterns, cache_dir, jobs
+        )
+    else:
+        monthly_counts, _, skipped = analyze_chunks(
+            emails, keys, keyword_patterns, jobs
+        )
+        checks = len(emails.index) * len(keyword_patterns)
+        print(format_skipped(skipped, checks, "keyword checks"))
+
+    return build_spam_analysis(monthly_counts, keyword_patterns)
+
+
+def main(argv=None):
     parser = argparse.ArgumentParser(
         description="Analyze spam keyword frequency over time"
     )
     parser.add_argument("input_file", help="Input email dataset (JSON)")
     parser.add_argument("--output", help="Output file")
     parser.add_argument("--keywords", help="Custom keyword patterns (JSON file)")
+    parser.add_argument(
+        "--cache-dir",
+        default="cache/spam",
+        help="Directory for incremental monthly aggregates (default: cache/spam)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Analyze the full history without reading or writing the cache",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Worker processes for keyword matching (0 = all cores, default: 1)",
+    )
+    add_date_range_arguments(parser)
 
-    args = parser.parse_args()
-
-    # Regex patterns matching common marketing/spam keywords
-    # Each pattern targets a specific spam category using word boundaries (\b)
-    # to match whole words only, with pipes (|) for alternatives
-    default_patterns = {
-        "survey": r"\b(survey|questionnaire|feedback|review)\b",
-        "rate_us": r"\b(rate\s+us|rating|review\s+us|tell\s+us\s+what)\b",
-        "take_minutes": r"\b(take\s+\d+\s+minutes?|quick\s+survey|brief\s+survey)\b",
-        "satisfaction": r"\b(satisfaction|experience|service|how\s+did\s+we\s+do)\b",
-        "win_prizes": r"\b(win|prize|reward|gift\s+card|enter\s+to\s+win)\b",
-        "limited_time": r"\b(limited\s+time|expires|hurry|act\s+now|don't\s+miss)\b",
-        "unsubscribe_bait": r"\b(unsubscribe|opt\s+out|remove|preferences)\b",
-    }
+    args = parser.parse_args(argv)
+
+    default_patterns = dict(DEFAULT_PATTERNS)
 
     # Load custom keywords if provided
     if args.keywords:
@@ -141,18 +435,18 @@ def main():
             default_patterns.update(custom_patterns)
 
     # Load emails
-    emails_frame = pd.read_json(args.input_file)
-    required_columns = {"date", "subject", "body"}
-    missing_columns = required_columns.difference(emails_frame.columns)
-    if missing_columns:
-        raise ValueError(
-            f"Missing required columns in JSON: {', '.join(sorted(missing_columns))}"
-        )
+    columns = ["date", "subject", "body"]
+    emails_frame = load_emails(args.input_file, columns, columns)
+    emails_frame = date_window(emails_frame, args.since, args.until)
 
     print(f"Analyzing {len(emails_frame.index)} emails for spam keywords...")
 
     # Analyze spam patterns
-    analysis_data = analyze_spam_keywords(emails_frame, default_patterns)
+    cache_dir = None if args.no_cache else args.cache_dir
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count() or 1
+    analysis_data = analyze_spam_keywords(
+        emails_frame, default_patterns, cache_dir, jobs
+    )
 
     # Output results
     if args.output:
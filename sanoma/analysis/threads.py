@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Conversation thread analysis: sizes, reply latency and most active threads
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from sanoma.lib.dataset import load_emails
+from sanoma.lib.dates import add_date_range_arguments, date_window
+from sanoma.lib.output import write_data
+
+# Upper edges, in seconds, of the reply latency histogram buckets.
+LATENCY_BUCKETS = [
+    ("under 1 hour", 3600),
+    ("1-6 hours", 6 * 3600),
+    ("6-24 hours", 24 * 3600),
+    ("1-3 days", 3 * 86400),
+    ("3-7 days", 7 * 86400),
+    ("1-4 weeks", 28 * 86400),
+    ("over 4 weeks", None),
+]
+LATENCY_PERCENTILES = [50, 75, 90, 99]
+
+
+def sort_by_thread(emails):
+    """Sort emails by conversation then date, returning arrays and segments
+
+    Returns the sorted positions, conversation ids and timestamps (seconds)
+    together with the start offset of every thread. Emails without a
+    conversation or a parseable date are left out.
+    """
+    dates = pd.to_datetime(
+        emails["date"].astype(str).str.slice(0, 19),
+        format="%Y-%m-%d %H:%M:%S",
+        errors="coerce",
+    )
+    conversations = pd.to_numeric(emails["conversation_id"], errors="coerce")
+    valid = (dates.notna() & conversations.notna()).to_numpy()
+    positions = np.flatnonzero(valid)
+    seconds = dates[valid].to_numpy().astype("datetime64[s]").astype(np.int64)
+    threads = conversations[valid].to_numpy().astype(np.int64)
+
+    order = np.lexsort((seconds, threads))
+    positions = positions[order]
+    threads = threads[order]
+    seconds = seconds[order]
+    boundaries = np.flatnonzero(threads[1:] != threads[:-1]) + 1
+    starts = np.concatenate(([0], boundaries)) if len(threads) else boundaries
+    return positions, threads, seconds, starts.astype(np.int64)
+
+
+def size_distribution(sizes):
+    """Count threads by number of messages"""
+    counts = np.bincount(sizes)
+    return [
+        {"messages": int(size), "threads": int(counts[size])}
+        for size in np.flatnonzero(counts)
+    ]
+
+
+def latency_summary(latencies):
+    """Summarize reply latencies (seconds) as percentiles and buckets"""
+    if not len(latencies):
+        return {"replies": 0, "percentiles_hours": {}, "buckets": []}
+    edges = [edge for _, edge in LATENCY_BUCKETS if edge is not None]
+    counts = np.bincount(
+        np.searchsorted(edges, latencies, side="right"),
+        minlength=len(LATENCY_BUCKETS),
+    )
+    percentiles = np.percentile(latencies, LATENCY_PERCENTILES) / 3600
+    return {
+        "replies": int(len(latencies)),
+        "mean_hours": float(latencies.mean() / 3600),
+        "percentiles_hours": {
+            f"p{p}": float(value) for p, value in zip(LATENCY_PERCENTILES, percentiles)
+        },
+        "buckets": [
+            {"latency": label, "replies": int(count)}
+            for (label, _), count in zip(LATENCY_BUCKETS, counts)
+        ],
+    }
+
+
+def analyze_threads(emails, top=20):
+    """Compute thread sizes, reply latencies and the most active threads
+
+    Threads are contiguous segments after one sort by (conversation, date),
+    so every per-thread figure is a segment reduction over flat arrays.
+    """
+    positions, threads, seconds, starts = sort_by_thread(emails)
+    ends = np.append(starts[1:], len(threads)).astype(np.int64)[: len(starts)]
+    sizes = ends - starts
+
+    # Gaps between consecutive messages of the same thread are replies.
+    gaps = np.diff(seconds)
+    same_thread = threads[1:] == threads[:-1]
+    reply_latencies = gaps[same_thread]
+    replied = sizes > 1
+    first_replies = seconds[starts[replied] + 1] - seconds[starts[replied]]
+
+    # Distinct senders per thread from unique (thread, sender) pairs.
+    senders = emails["from"].fillna("").astype(str).str.lower().to_numpy()
+    sender_codes, distinct_senders = pd.factorize(senders[positions])
+    thread_index = np.repeat(np.arange(len(starts)), sizes)
+    pairs = np.unique(thread_index * len(distinct_senders) + sender_codes)
+    participants = np.bincount(
+        pairs // max(len(distinct_senders), 1), minlength=len(starts)
+    )
+
+    # Most messages first, most recent activity breaking ties.
+    last_seen = seconds[ends - 1] if len(starts) else seconds
+    ranked = np.lexsort((-last_seen, -sizes))[:top]
+    subjects = emails["subject"].fillna("").astype(str).to_numpy()
+    most_active = [
+        {
+            "conversation_id": int(threads[starts[t]]),
+            "subject": subjects[positions[starts[t]]],
+            "messages": int(sizes[t]),
+            "participants": int(participants[t]),
+            "first_date": str(np.datetime64(int(seconds[starts[t]]), "s")),
+            "last_date": str(np.datetime64(int(last_seen[t]), "s")),
+            "duration_days": float((last_seen[t] - seconds[starts[t]]) / 86400),
+        }
+        for t in ranked
+    ]
+
+    return {
+        "summary": {
+            "emails": int(len(threads)),
+            "threads": int(len(starts)),
+            "threads_with_replies": int(replied.sum()),
+            "mean_thread_size": float(sizes.mean()) if len(sizes) else 0.0,
+            "max_thread_size": int(sizes.max(initial=0)),
+        },
+        "thread_sizes": size_distribution(sizes),
+        "reply_latency": latency_summary(reply_latencies),
+        "first_reply_latency": latency_summary(first_replies),
+        "most_active_threads": most_active,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Conversation thread analysis")
+    parser.add_argument("input_file", help="Input dataset file")
+    parser.add_argument(
+        "--top", type=int, default=20, help="Most active threads to list (default: 20)"
+    )
+    parser.add_argument("--output", help="Output file for analysis results")
+    add_date_range_arguments(parser)
+
+    args = parser.parse_args(argv)
+
+    columns = ["conversation_id", "date", "from", "subject"]
+    emails = load_emails(args.input_file, columns, columns)
+    emails = date_window(emails, args.since, args.until)
+    results = analyze_threads(emails, args.top)
+
+    if args.output:
+        format_used = write_data(results, args.output, "json")
+        print(f"Thread analysis saved to {args.output} ({format_used})")
+    else:
+        summary = results["summary"]
+        latency = results["reply_latency"]
+        print("Thread Analysis:")
+        print(f"  Threads: {summary['threads']} ({summary['emails']} emails)")
+        print(f"  With replies: {summary['threads_with_replies']}")
+        print(f"  Mean thread size: {summary['mean_thread_size']:.2f}")
+        if latency["replies"]:
+            median = latency["percentiles_hours"]["p50"]
+            print(f"  Median reply latency: {median:.1f} hours")
+        print("\nMost active threads:")
+        for thread in results["most_active_threads"]:
+            print(
+                f"  {thread['messages']:>4} messages, "
+                f"{thread['participants']:>3} senders  {thread['subject'][:50]}"
+            )
+
+
+if __name__ == "__main__":
+    main()
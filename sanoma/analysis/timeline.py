@@ -4,21 +4,38 @@ Temporal analysis tool using the sanoma CLI API and lib output adapters
 """
 
 import argparse
+from collections import Counter, defaultdict
+from pathlib import Path
 from typing import cast
 
+import numpy as np
 import pandas as pd
 
+from sanoma.lib.cube import is_cube, load_counts
+from sanoma.lib.dataset import iter_email_chunks
+from sanoma.lib.dates import add_date_range_arguments, date_window
 from sanoma.lib.output import write_data  # noqa: E402
+from sanoma.lib.sketch import HyperLogLog, add_sketch_arguments
 
 
 AnalysisRow = dict[str, int | float | str]
 SummaryAnalysis = dict[str, object]
 
+WEEKDAYS = [
+    "Monday",
+    "Tuesday",
+    "Wednesday",
+    "Thursday",
+    "Friday",
+    "Saturday",
+    "Sunday",
+]
+
 
 def build_group_stats(grouped):
-    """Build totals and with_body counts from grouped rows"""
-    totals = grouped.size()
-    with_body = grouped["has_body_bool"].sum()
+    """Build totals and with_body counts from grouped, count-weighted rows"""
+    totals = grouped["count"].sum()
+    with_body = grouped["body_count"].sum()
     return totals, with_body
 
 
@@ -67,6 +84,134 @@ def analyze_by_hour(emails):
     }
 
 
+def count_buckets(codes, counts, body_counts, size):
+    """Count emails and emails with bodies per integer bucket code"""
+    totals = np.bincount(codes, weights=counts, minlength=size).astype(int)
+    with_body = np.bincount(codes, weights=body_counts, minlength=size).astype(int)
+    return totals, with_body
+
+
+def bucket_rows(labels, totals, with_body):
+    """Build output rows for non-empty buckets, labels mapping column to values"""
+    rows = []
+    for code in np.flatnonzero(totals):
+        row: AnalysisRow = {column: values[code] for column, values in labels.items()}
+        row["total_emails"] = int(totals[code])
+        row["emails_with_body"] = int(with_body[code])
+        row["body_percentage"] = int(with_body[code]) / int(totals[code]) * 100
+        rows.append(row)
+    return rows
+
+
+def analyze_all(emails, year=None, hours=True):
+    """Build year, month, weekday, hour and weekday x hour tables in one pass
+
+    Dates are parsed once and reduced to integer bucket codes, so each table
+    is a single numpy.bincount over the whole dataset. Pass hours=False for
+    day-level input such as a count cube.
+    """
+    dates = emails["date_parsed"].dt
+    counts = emails["count"].to_numpy(dtype=float)
+    body_counts = emails["body_count"].to_numpy(dtype=float)
+    years = dates.year.to_numpy()
+    months = dates.month.to_numpy() - 1
+    weekdays = dates.weekday.to_numpy()
+    first = int(years.min()) if len(years) else 0
+    span = int(years.max()) - first + 1 if len(years) else 0
+
+    year_labels = [first + offset for offset in range(span)]
+    month_labels = [f"{y}-{m:02d}" for y in year_labels for m in range(1, 13)]
+    month_codes = (years - first) * 12 + months
+    month_counts = counts
+    month_body_counts = body_counts
+    if year is not None:
+        in_year = years == year
+        month_codes = month_codes[in_year]
+        month_counts = counts[in_year]
+        month_body_counts = body_counts[in_year]
+
+    sections = {
+        "year": bucket_rows(
+            {"year": year_labels},
+            *count_buckets(years - first, counts, body_counts, span),
+        ),
+        "month": bucket_rows(
+            {"month": month_labels},
+            *count_buckets(month_codes, month_counts, month_body_counts, span * 12),
+        ),
+        "weekday": bucket_rows(
+            {"weekday": WEEKDAYS}, *count_buckets(weekdays, counts, body_counts, 7)
+        ),
+    }
+    if hours:
+        hour_codes = dates.hour.to_numpy()
+        sections["hour"] = bucket_rows(
+            {"hour": list(range(24))},
+            *count_buckets(hour_codes, counts, body_counts, 24),
+        )
+        sections["weekday_hour"] = bucket_rows(
+            {
+                "weekday": [day for day in WEEKDAYS for _ in range(24)],
+                "hour": list(range(24)) * 7,
+            },
+            *count_buckets(weekdays * 24 + hour_codes, counts, body_counts, 7 * 24),
+        )
+    return sections
+
+
+def parse_dates(emails):
+    """Parse the date column, leaving unparseable dates as NaT"""
+    return pd.to_datetime(
+        emails["date"].astype(str).str.slice(0, 19),
+        format="%Y-%m-%d %H:%M:%S",
+        errors="coerce",
+    )
+
+
+def sender_addresses(emails):
+    """Get the lowercased sender address from each From header"""
+    senders = emails["from"].fillna("").astype(str)
+    addresses = senders.str.extract(r"<([^<>]+)>", expand=False)
+    return addresses.fillna(senders).str.strip().str.lower()
+
+
+def approximate_periods(input_file, period, year=None, chunk_size=10000, **window):
+    """Stream the dataset, counting emails and sketching unique senders per period
+
+    Totals are exact; unique senders per year or month come from one
+    HyperLogLog per period, merged across chunks.
+    """
+    totals = Counter()
+    with_body = Counter()
+    senders = defaultdict(HyperLogLog)
+    columns = {"date", "has_body", "from"}
+    for chunk in iter_email_chunks(input_file, chunk_size, columns):
+        chunk = date_window(chunk, window.get("since"), window.get("until"))
+        dates = parse_dates(chunk)
+        valid = dates.notna()
+        if year is not None:
+            valid &= dates.dt.year == year
+        valid = valid.to_numpy()
+        chunk = chunk[valid]
+        keys = dates[valid].dt.strftime("%Y" if period == "year" else "%Y-%m")
+        keys = keys.astype(int) if period == "year" else keys
+
+        grouped = chunk.assign(key=keys.to_numpy(), sender=sender_addresses(chunk))
+        for key, group in grouped.groupby("key", sort=False):
+            totals[key] += len(group.index)
+            with_body[key] += int(group["has_body"].astype(bool).sum())
+            senders[key].merge(HyperLogLog().update(group["sender"].unique()))
+
+    return {
+        key: {
+            "total": totals[key],
+            "with_body": with_body[key],
+            "unique_senders": senders[key].estimate(),
+        }
+        for key in totals
+    }
+
+
 def get_date_range(emails):
     """Get the date range of the dataset"""
     if emails.empty:
@@ -74,37 +219,133 @@ def get_date_range(emails):
     return emails["date_parsed"].min(), emails["date_parsed"].max()
 
 
-def main():
+def write_analysis(args, analysis_data):
+    """Save analysis results, or print them to the console"""
+    if args.output:
+        format_used = write_data(analysis_data, args.output, "json")
+        print(f"Temporal analysis saved to {args.output} ({format_used})")
+    else:
+        # Console output
+        if args.analysis == "summary":
+            summary_data = cast(SummaryAnalysis, analysis_data)
+            info = cast(dict[str, object], summary_data["dataset_info"])
+            date_range = cast(dict[str, str | None], info["date_range"])
+            start = date_range["start"]
+            end = date_range["end"]
+            print("Temporal Analysis Summary:")
+            print(f"  Total emails: {info['total_emails']}")
+            print(f"  With bodies: {info['emails_with_body']}")
+            if start is not None and end is not None:
+                print(f"  Date range: {start[:10]} to {end[:10]}")
+
+            print("\nTop 5 years by volume:")
+            by_year = cast(dict[int, dict[str, int]], summary_data["by_year"])
+            yearly_sorted = sorted(
+                by_year.items(),
+                key=lambda x: x[1]["total"],
+                reverse=True,
+            )
+            for year, data in yearly_sorted[:5]:
+                print(f"  {year}: {data['total']} emails")
+        else:
+            rows = cast(list[AnalysisRow], analysis_data)
+            print(f"Temporal Analysis ({args.analysis}):")
+            for item in rows:
+                if "year" in item:
+                    period = item["year"]
+                elif "month" in item:
+                    period = item["month"]
+                elif "weekday" in item:
+                    period = item["weekday"]
+                else:
+                    period = item["hour"]
+                print(
+                    f"  {period}: {item['total_emails']} emails "
+                    f"({item['body_percentage']:.1f}% with bodies)"
+                )
+
+
+def write_all_analysis(args, sections):
+    """Save every table as a section of one file, as separate files, or print"""
+    if args.output_dir:
+        output_dir = Path(args.output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        for name, rows in sections.items():
+            write_data(rows, output_dir / f"{name}.json", "json")
+        print(f"Temporal analysis tables saved to {output_dir}/")
+    elif args.output:
+        format_used = write_data(sections, args.output, "json")
+        print(f"Temporal analysis saved to {args.output} ({format_used})")
+    else:
+        for name, rows in sections.items():
+            if name == "weekday_hour":
+                continue
+            print(f"Temporal Analysis ({name}):")
+            for item in rows:
+                print(
+                    f"  {item[name]}: {item['total_emails']} emails "
+                    f"({item['body_percentage']:.1f}% with bodies)"
+                )
+
+
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Temporal analysis for email datasets")
     parser.add_argument("input_file", help="Input dataset file")
     parser.add_argument(
         "--analysis",
-        choices=["year", "month", "weekday", "hour", "summary"],
+        choices=["year", "month", "weekday", "hour", "summary", "all"],
         default="summary",
         help="Type of temporal analysis (default: summary)",
     )
     parser.add_argument("--year", type=int, help="Specific year for monthly analysis")
     parser.add_argument("--output", help="Output file for analysis results")
+    parser.add_argument(
+        "--output-dir",
+        help="With --analysis all, write each table to its own file here",
+    )
+    add_date_range_arguments(parser)
+    add_sketch_arguments(parser)
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
-    emails_frame = pd.read_json(args.input_file)
-    required_columns = {"date", "has_body"}
-    missing_columns = required_columns.difference(emails_frame.columns)
-    if missing_columns:
-        raise ValueError(
-            f"Missing required columns in JSON: {', '.join(sorted(missing_columns))}"
+    if args.approximate:
+        if args.analysis not in ("year", "month"):
+            parser.error("--approximate supports year and month analysis")
+        results = approximate_periods(
+            args.input_file,
+            args.analysis,
+            args.year if args.analysis == "month" else None,
+            args.chunk_size,
+            since=args.since,
+            until=args.until,
         )
-    date_series = pd.to_datetime(
-        emails_frame["date"].astype(str).str.slice(0, 19),
-        format="%Y-%m-%d %H:%M:%S",
-        errors="coerce",
-    )
+        analysis_data = [
+            {
+                args.analysis: period,
+                "total_emails": data["total"],
+                "emails_with_body": data["with_body"],
+                "body_percentage": data["with_body"] / data["total"] * 100,
+                "unique_senders": data["unique_senders"],
+            }
+            for period, data in sorted(results.items())
+        ]
+        write_analysis(args, analysis_data)
+        return
+
+    from_cube = is_cube(args.input_file)
+    if from_cube and args.analysis == "hour":
+        parser.error("hour analysis needs the extracted dataset, not a day-level cube")
+    emails_frame = load_counts(args.input_file, {"date", "has_body"})
+    emails_frame = date_window(emails_frame, args.since, args.until)
     emails = emails_frame.assign(
-        date_parsed=date_series,
-        has_body_bool=emails_frame["has_body"].astype(bool),
+        date_parsed=parse_dates(emails_frame),
+        body_count=emails_frame["count"] * emails_frame["has_body"].astype(bool),
     ).dropna(subset=["date_parsed"])
 
+    if args.analysis == "all":
+        write_all_analysis(args, analyze_all(emails, args.year, not from_cube))
+        return
+
     # Perform analysis based on type
     analysis_data: list[AnalysisRow] | SummaryAnalysis
     if args.analysis == "year":
@@ -139,15 +380,6 @@ def main():
         ]
     elif args.analysis == "weekday":
         results = analyze_by_weekday(emails)
-        weekday_order = [
-            "Monday",
-            "Tuesday",
-            "Wednesday",
-            "Thursday",
-            "Friday",
-            "Saturday",
-            "Sunday",
-        ]
         analysis_data = [
             {
                 "weekday": day,
@@ -159,7 +391,7 @@ def main():
                     else 0
                 ),
             }
-            for day in weekday_order
+            for day in WEEKDAYS
             if day in results
         ]
     elif args.analysis == "hour":
@@ -184,8 +416,8 @@ def main():
 
         analysis_data = {
             "dataset_info": {
-                "total_emails": len(emails),
-                "emails_with_body": int(emails["has_body_bool"].sum()),
+                "total_emails": int(emails["count"].sum()),
+                "emails_with_body": int(emails["body_count"].sum()),
                 "date_range": {
                     "start": start_date.isoformat() if start_date else None,
                     "end": end_date.isoformat() if end_date else None,
@@ -195,49 +427,7 @@ def main():
             "by_weekday": weekday,
         }
 
-    # Output results
-    if args.output:
-        format_used = write_data(analysis_data, args.output, "json")
-        print(f"Temporal analysis saved to {args.output} ({format_used})")
-    else:
-        # Console output
-        if args.analysis == "summary":
-            summary_data = cast(SummaryAnalysis, analysis_data)
-            info = cast(dict[str, object], summary_data["dataset_info"])
-            date_range = cast(dict[str, str | None], info["date_range"])
-            start = date_range["start"]
-            end = date_range["end"]
-            print("Temporal Analysis Summary:")
-            print(f"  Total emails: {info['total_emails']}")
-            print(f"  With bodies: {info['emails_with_body']}")
-            if start is not None and end is not None:
-                print(f"  Date range: {start[:10]} to {end[:10]}")
-
-            print("\nTop 5 years by volume:")
-            by_year = cast(dict[int, dict[str, int]], summary_data["by_year"])
-            yearly_sorted = sorted(
-                by_year.items(),
-                key=lambda x: x[1]["total"],
-                reverse=True,
-            )
-            for year, data in yearly_sorted[:5]:
-                print(f"  {year}: {data['total']} emails")
-        else:
-            rows = cast(list[AnalysisRow], analysis_data)
-            print(f"Temporal Analysis ({args.analysis}):")
-            for item in rows:
-                if "year" in item:
-                    period = item["year"]
-                elif "month" in item:
-                    period = item["month"]
-                elif "weekday" in item:
-                    period = item["weekday"]
-                else:
-                    period = item["hour"]
-                print(
-                    f"  {period}: {item['total_emails']} emails "
-                    f"({item['body_percentage']:.1f}% with bodies)"
-                )
+    write_analysis(args, analysis_data)
 
 
 if __name__ == "__main__":
@@ -3,9 +3,10 @@
 Configuration management for sanoma
 """
 
-import yaml
 from pathlib import Path
 
+from sanoma.lib.domains import matches_domain_pattern
+
 
 def load_config(config_file="config.yaml"):
     """Load configuration from YAML file"""
@@ -13,6 +14,8 @@ def load_config(config_file="config.yaml"):
     if not config_path.exists():
         return {}
 
+    import yaml
+
     with open(config_path, "r") as f:
         return yaml.safe_load(f)
 
@@ -119,12 +122,9 @@ def should_filter_email(email, filters):
         "ignore_from_domains", filters.get("ignore_domains", [])
     )
     if ignore_from_domains:
-        domain = email.get("from_domain", "").lower()
+        domain = email.get("from_domain", "")
         for ignore_pattern in ignore_from_domains:
-            if ignore_pattern.startswith("*."):
-                if domain.endswith(ignore_pattern[2:].lower()):
-                    return True
-            elif domain == ignore_pattern.lower():
+            if matches_domain_pattern(domain, ignore_pattern):
                 return True
 
     # Check include_from_domains (overrides ignore, backward compatibility)
@@ -132,17 +132,11 @@ def should_filter_email(email, filters):
         "include_from_domains", filters.get("include_domains", [])
     )
     if include_from_domains:
-        domain = email.get("from_domain", "").lower()
-        included = False
-        for include_pattern in include_from_domains:
-            if include_pattern.startswith("*."):
-                if domain.endswith(include_pattern[2:].lower()):
-                    included = True
-                    break
-            elif domain == include_pattern.lower():
-                included = True
-                break
-        if not included:
+        domain = email.get("from_domain", "")
+        if not any(
+            matches_domain_pattern(domain, include_pattern)
+            for include_pattern in include_from_domains
+        ):
             return True
 
     # Check ignore_to_domains
@@ -161,14 +155,5 @@ def should_filter_email(email, filters):
             if ignore_folder.lower() in folder:
                 return True
 
-    # Check date ranges
-    date_after = filters.get("date_after")
-    date_before = filters.get("date_before")
-    if date_after or date_before:
-        email_date = email.get("date", "")
-        if date_after and email_date < date_after:
-            return True
-        if date_before and email_date > date_before:
-            return True
-
+    # Date ranges (date_after/date_before) are applied by the extraction query.
     return False
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Dataset loading helpers for extracted email JSON
+"""
+
+import json
+import os
+import re
+import threading
+import weakref
+from contextlib import contextmanager
+
+# Whitespace and commas between the objects of a JSON array.
+SEPARATOR = re.compile(r"[\s,]*")
+
+# Per-run registry of loaded datasets, active only inside shared_datasets().
+_registry = None
+_registry_lock = threading.Lock()
+# Frames holding rows of a registered dataset, by id: see dataset_source().
+_sources = {}
+
+
+@contextmanager
+def shared_datasets():
+    """Share each loaded dataset among in-process callers until the block exits
+
+    Within the block, load_emails parses a path once and hands every caller a
+    shallow copy of the same frame. The copies stay valid until the file
+    changes on disk or is rewritten through write_data. Nested blocks reuse
+    the outer registry and yield False, so they know not to evict what the
+    outer block loaded; the outermost block yields True.
+    """
+    global _registry
+    previous = _registry
+    _registry = {} if previous is None else previous
+    try:
+        yield previous is None
+    finally:
+        _registry = previous
+
+
+def forget_dataset(input_file):
+    """Drop a path from the shared registry after it has been rewritten"""
+    if _registry is not None:
+        with _registry_lock:
+            _registry.pop(os.path.abspath(input_file), None)
+
+
+def loaded_rows(input_file):
+    """Get the row count of a dataset the shared registry holds, if current"""
+    registry = _registry
+    entry = registry.get(os.path.abspath(input_file)) if registry else None
+    if not entry or "frame" not in entry or not os.path.exists(input_file):
+        return None
+    if entry["version"] != dataset_version(input_file):
+        return None
+    return len(entry["frame"].index)
+
+
+def track_rows(emails, derived, positions=None):
+    """Record that ``derived`` holds rows of ``emails`` from the shared registry
+
+    ``positions`` selects the rows ``derived`` kept, in order; by default it
+    kept all of them. Frames of unregistered data are returned untracked.
+    """
+    tracked = _sources.get(id(emails))
+    if tracked is None or tracked[0]() is not emails:
+        return derived
+    _, entry, version, rows = tracked
+    if positions is not None:
+        import numpy as np
+
+        selected = np.arange(len(emails.index))[positions]
+        rows = selected if rows is None else rows[selected]
+    return _track(derived, entry, version, rows)
+
+
+def _track(frame, entry, version, rows=None):
+    """Remember which registry entry and rows a handed-out frame holds"""
+    key = id(frame)
+    # The record goes away with the frame, before its id can be reused.
+    ref = weakref.ref(frame, lambda _: _sources.pop(key, None))
+    _sources[key] = (ref, entry, version, rows)
+    return frame
+
+
+def dataset_source(emails):
+    """Get the shared dataset a frame's rows come from
+
+    Returns ``(cache, frame, rows)`` for frames load_emails handed out and
+    those derived through track_rows: a dict for values derived from the
+    dataset, kept until it is reloaded; the registered frame; and the row
+    positions the frame holds, or None for all of them. Other frames get None.
+    """
+    tracked = _sources.get(id(emails))
+    if tracked is None or tracked[0]() is not emails:
+        return None
+    _, entry, version, rows = tracked
+    # A reload swaps the frame, version and cache together under this lock.
+    with entry["lock"]:
+        if entry.get("version") != version:
+            return None
+        return entry["cache"], entry["frame"], rows
+
+
+def _read_json(input_file, columns=None):
+    """Parse a dataset JSON file into a DataFrame, importing pandas on demand
+
+    With ``columns``, records are streamed and only those of the file's
+    columns are kept, so columns left out are never held in memory at once.
+    Returns the frame and every column the file has.
+    """
+    import pandas as pd
+
+    if columns is None:
+        frame = pd.read_json(input_file, convert_dates=False)
+        return frame, set(frame.columns)
+
+    file_columns = {}
+    values = {column: [] for column in columns}
+    rows = 0
+    for record in iter_records(input_file):
+        file_columns.update(dict.fromkeys(record))
+        for column, column_values in values.items():
+            column_values.append(record.get(column))
+        rows += 1
+    frame = pd.DataFrame(
+        {column: values[column] for column in file_columns if column in values},
+        index=pd.RangeIndex(rows),
+    )
+    return frame, set(file_columns)
+
+
+def refresh_datasets():
+    """Re-parse registered datasets whose files changed, dropping deleted ones
+
+    Returns the paths that were reloaded.
+    """
+    registry = _registry
+    if registry is None:
+        return []
+    with _registry_lock:
+        entries = list(registry.items())
+
+    reloaded = []
+    for path, entry in entries:
+        if not os.path.exists(path):
+            forget_dataset(path)
+            continue
+        # Readers block on the entry lock rather than see the stale frame.
+        with entry["lock"]:
+            version = dataset_version(path)
+            if "frame" in entry and entry["version"] != version:
+                entry["frame"], _ = _read_json(path, entry["columns"])
+                entry["version"] = version
+                entry["cache"] = {}
+                reloaded.append(path)
+    return reloaded
+
+
+def loaded_datasets():
+    """List the paths and row counts held by the shared registry"""
+    registry = _registry
+    if registry is None:
+        return {}
+    with _registry_lock:
+        entries = list(registry.items())
+    return {
+        path: len(entry["frame"].index) for path, entry in entries if "frame" in entry
+    }
+
+
+def _read_emails(input_file, columns=None):
+    """Parse a dataset file, reusing the shared registry when one is active
+
+    ``columns`` limits what the caller needs. The registry keeps only the
+    columns its readers have asked for, re-parsing to widen the cached frame
+    when a later reader needs more, so an unused body column is not held.
+    """
+    # Dates stay as "YYYY-MM-DD HH:MM:SS" strings so they round-trip through
+    # write_data and can be range-searched lexicographically.
+    registry = _registry
+    if registry is None:
+        return _read_json(input_file, columns)[0]
+
+    version = dataset_version(input_file)
+    with _registry_lock:
+        entry = registry.setdefault(
+            os.path.abspath(input_file), {"lock": threading.Lock()}
+        )
+    # Concurrent first readers of a path wait for a single parse.
+    with entry["lock"]:
+        fresh = entry.get("version") == version
+        cached = entry.get("columns")
+        covered = fresh and (
+            cached is None
+            or (columns is not None and set(columns) & entry["file_columns"] <= cached)
+        )
+        if not covered:
+            keep = None
+            if columns is not None:
+                keep = set(columns) | (cached if fresh else set())
+            entry["frame"], entry["file_columns"] = _read_json(input_file, keep)
+            entry["columns"] = None if keep is None else keep & entry["file_columns"]
+            if not fresh:
+                entry["cache"] = {}
+            entry["version"] = version
+        return _track(entry["frame"].copy(deep=False), entry, version)
+
+
+def load_emails(input_file, required_columns=(), columns=None):
+    """Load an extracted email dataset, keeping dates as strings
+
+    ``columns`` projects the frame down to the columns a caller reads.
+    """
+    wanted = None if columns is None else set(columns) | set(required_columns)
+    emails = _read_emails(input_file, wanted)
+    missing_columns = set(required_columns).difference(emails.columns)
+    if missing_columns:
+        raise ValueError(
+            f"Missing required columns in JSON: {', '.join(sorted(missing_columns))}"
+        )
+    return emails if columns is None else track_rows(emails, emails[list(columns)])
+
+
+def dataset_version(input_file):
+    """Identify the current version of a dataset file by size and mtime"""
+    stat = os.stat(input_file)
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+
+def iter_records(input_file, block_size=1 << 20):
+    """Stream the objects of a JSON array file without loading it whole"""
+    decoder = json.JSONDecoder()
+    with open(input_file) as f:
+        buffer = f.read(block_size).lstrip()
+        if not buffer.startswith("["):
+            raise ValueError(f"Expected a JSON array in {input_file}")
+        position = 1
+        eof = False
+        while True:
+            position = SEPARATOR.match(buffer, position).end()
+            if buffer.startswith("]", position):
+                return
+            try:
+                record, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                block = f.read(block_size)
+                eof = not block
+                buffer = buffer[position:] + block
+                position = 0
+                continue
+            yield record
+
+
+def iter_email_chunks(input_file, chunk_size, required_columns=()):
+    """Stream an extracted email dataset as DataFrames of chunk_size rows"""
+    batch = []
+    for record in iter_records(input_file):
+        batch.append(record)
+        if len(batch) >= chunk_size:
+            yield _chunk_frame(batch, required_columns)
+            batch = []
+    if batch:
+        yield _chunk_frame(batch, required_columns)
+
+
+def _chunk_frame(records, required_columns):
+    """Build one chunk DataFrame and check it carries the required columns"""
+    import pandas as pd
+
+    emails = pd.DataFrame.from_records(records)
+    missing_columns = set(required_columns).difference(emails.columns)
+    if missing_columns:
+        raise ValueError(
+            f"Missing required columns in JSON: {', '.join(sorted(missing_columns))}"
+        )
+    return emails
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Date range helpers for --since/--until filtering on sorted date columns
+"""
+
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone
+
+from sanoma.lib.dataset import track_rows
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Lowest valid timestamp string; also excludes rows with an empty date.
+MIN_DATE = "0001-01-01 00:00:00"
+MAX_DATE = "9999-12-31 23:59:59"
+
+# Accepted bound formats and the period each one covers.
+BOUND_FORMATS = [
+    ("%Y-%m-%d %H:%M:%S", "second"),
+    ("%Y-%m-%dT%H:%M:%S", "second"),
+    ("%Y-%m-%d %H:%M", "minute"),
+    ("%Y-%m-%d", "day"),
+    ("%Y-%m", "month"),
+    ("%Y", "year"),
+]
+
+
+def _period_end(start, period):
+    """Get the first timestamp after the period starting at start"""
+    if period == "year":
+        return start.replace(year=start.year + 1)
+    if period == "month":
+        if start.month == 12:
+            return start.replace(year=start.year + 1, month=1)
+        return start.replace(month=start.month + 1)
+    if period == "day":
+        return start + timedelta(days=1)
+    if period == "minute":
+        return start + timedelta(minutes=1)
+    return start + timedelta(seconds=1)
+
+
+def parse_bound(value, end=False):
+    """Parse a date bound such as 2016, 2016-03 or 2016-03-01
+
+    Start bounds are inclusive. End bounds are returned exclusive and cover
+    the whole period named, so an end bound of 2016 includes all of 2016.
+    """
+    value = str(value).strip()
+    for fmt, period in BOUND_FORMATS:
+        try:
+            start = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        return _period_end(start, period) if end else start
+    raise ValueError(f"Invalid date bound: {value}")
+
+
+def date_bounds(since=None, until=None):
+    """Get [lower, upper) timestamp strings for a since/until range"""
+    lower = parse_bound(since).strftime(DATE_FORMAT) if since else MIN_DATE
+    if until:
+        try:
+            upper = parse_bound(until, end=True).strftime(DATE_FORMAT)
+        except OverflowError:
+            upper = MAX_DATE
+    else:
+        upper = MAX_DATE
+    return lower, upper
+
+
+def add_date_range_arguments(parser):
+    """Add --since/--until date range options to an argument parser"""
+    parser.add_argument(
+        "--since", help="Only emails on or after this date (e.g. 2016, 2016-03)"
+    )
+    parser.add_argument(
+        "--until", help="Only emails on or before this date (e.g. 2016-12-31)"
+    )
+
+
+def bound_micros(bound):
+    """Convert a timestamp string bound to Gloda's microseconds since epoch"""
+    moment = datetime.strptime(bound, DATE_FORMAT).replace(tzinfo=timezone.utc)
+    return int(moment.timestamp()) * 1000000
+
+
+def _bisect_window(values, lower, upper, descending):
+    """Locate the [start, stop) positions of lower <= value < upper"""
+    size = len(values)
+    if descending:
+
+        def key(i):
+            return values[size - 1 - i]
+
+    else:
+        key = values.__getitem__
+    low = bisect_left(range(size), lower, key=key)
+    high = bisect_left(range(size), upper, key=key)
+    if descending:
+        return size - high, size - low
+    return low, high
+
+
+def date_window(emails, since=None, until=None):
+    """Select emails dated within [since, until] by binary search
+
+    Extraction sorts by date, so the window is located with two binary
+    searches on the date column and returned as a positional slice. Unsorted
+    input falls back to a one-off argsort.
+    """
+    if not since and not until:
+        return emails
+    lower, upper = date_bounds(since, until)
+    dates = emails["date"]
+
+    ascending = dates.is_monotonic_increasing
+    if ascending or dates.is_monotonic_decreasing:
+        start, stop = _bisect_window(dates.array, lower, upper, not ascending)
+        return track_rows(emails, emails.iloc[start:stop], slice(start, stop))
+
+    date_strings = dates.fillna("").astype(str)
+    order = date_strings.argsort(kind="stable").to_numpy()
+    start, stop = _bisect_window(date_strings.array.take(order), lower, upper, False)
+    rows = sorted(order[start:stop])
+    return track_rows(emails, emails.iloc[rows], rows)
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Sender domain index with reversed-label suffix lookups and eTLD+1 rollups
+"""
+
+import copy
+import re
+from bisect import bisect_left
+
+from sanoma.lib.dataset import dataset_source, track_rows
+
+# Public suffixes spanning more than one label. Anything not listed here is
+# treated as a single-label suffix (com, edu, de, ...). This is a short
+# hand-picked list, not the Public Suffix List, so rollups under unlisted
+# multi-label suffixes (e.g. x.com.co) stop one label too high (com.co).
+MULTI_LABEL_SUFFIXES = frozenset(
+    [
+        "ac.id",
+        "ac.il",
+        "ac.in",
+        "ac.jp",
+        "ac.kr",
+        "ac.nz",
+        "ac.th",
+        "ac.uk",
+        "ac.za",
+        "co.id",
+        "co.il",
+        "co.in",
+        "co.jp",
+        "co.kr",
+        "co.nz",
+        "co.th",
+        "co.uk",
+        "co.za",
+        "com.ar",
+        "com.au",
+        "com.br",
+        "com.cn",
+        "com.eg",
+        "com.hk",
+        "com.mx",
+        "com.my",
+        "com.ph",
+        "com.pk",
+        "com.sa",
+        "com.sg",
+        "com.tr",
+        "com.tw",
+        "com.ua",
+        "com.vn",
+        "edu.au",
+        "edu.cn",
+        "gov.au",
+        "gov.br",
+        "gov.cn",
+        "gov.uk",
+        "go.jp",
+        "govt.nz",
+        "ne.jp",
+        "net.au",
+        "net.br",
+        "net.cn",
+        "net.in",
+        "net.nz",
+        "nhs.uk",
+        "or.jp",
+        "or.kr",
+        "org.au",
+        "org.br",
+        "org.cn",
+        "org.in",
+        "org.nz",
+        "org.uk",
+        "org.za",
+        "sch.uk",
+    ]
+)
+
+# Placeholder domains written by extract_domain.
+PLACEHOLDER_DOMAINS = frozenset(["", "unknown", "malformed"])
+
+
+def reverse_labels(domain):
+    """Reverse domain labels so suffixes sort together (mail.x.com -> com.x.mail)"""
+    return ".".join(reversed(domain.split(".")))
+
+
+def registrable_domain(domain):
+    """Get the registrable domain (eTLD+1), e.g. news.x.co.uk -> x.co.uk
+
+    Only suffixes in MULTI_LABEL_SUFFIXES are known to span two labels.
+    """
+    domain = str(domain).lower().strip(".")
+    if domain in PLACEHOLDER_DOMAINS:
+        return domain
+    labels = domain.split(".")
+    suffix_labels = 2 if ".".join(labels[-2:]) in MULTI_LABEL_SUFFIXES else 1
+    if len(labels) <= suffix_labels:
+        return domain
+    return ".".join(labels[-(suffix_labels + 1) :])
+
+
+def matches_suffix(domain, suffix):
+    """Check whether domain is suffix or one of its subdomains"""
+    return domain == suffix or domain.endswith("." + suffix)
+
+
+def matches_domain_pattern(domain, pattern):
+    """Check a domain against an exact name or a "*.suffix" wildcard"""
+    domain = str(domain).lower()
+    pattern = pattern.lower()
+    if pattern.startswith("*."):
+        return matches_suffix(domain, pattern[2:])
+    return domain == pattern
+
+
+class DomainIndex:
+    """Distinct sender domains sorted by reversed labels
+
+    Rows are mapped to distinct domains through integer codes, so pattern
+    lookups run over unique domains and expand back to rows in one pass.
+    """
+
+    def __init__(self, domains):
+        codes, uniques = domains.fillna("").astype(str).str.lower().factorize()
+        self.codes = codes
+        self.domains = [str(domain) for domain in uniques]
+        keys = [reverse_labels(domain) for domain in self.domains]
+        self.order = sorted(range(len(keys)), key=keys.__getitem__)
+        self.sorted_keys = [keys[code] for code in self.order]
+
+    def take(self, positions):
+        """Get the index of a subset of rows, sharing the distinct domains"""
+        subset = copy.copy(self)
+        subset.codes = self.codes[positions]
+        return subset
+
+    def suffix_codes(self, suffix):
+        """Get codes of domains equal to suffix or under it"""
+        key = reverse_labels(suffix.lower().strip("."))
+        codes = []
+        position = bisect_left(self.sorted_keys, key)
+        if position < len(self.sorted_keys) and self.sorted_keys[position] == key:
+            codes.append(self.order[position])
+        # Subdomains sort in the contiguous range [key + ".", key + "/").
+        start = bisect_left(self.sorted_keys, key + ".", lo=position)
+        stop = bisect_left(self.sorted_keys, key + "/", lo=start)
+        codes.extend(self.order[start:stop])
+        return codes
+
+    def pattern_codes(self, pattern):
+        """Get codes of domains matching a "*.suffix" wildcard or regex
+
+        Invalid regexes fall back to an exact, case-insensitive match.
+        """
+        if pattern.startswith("*."):
+            return self.suffix_codes(pattern[2:])
+        try:
+            regex = re.compile(pattern, re.IGNORECASE)
+        except re.error:
+            target = pattern.lower()
+            return [code for code, d in enumerate(self.domains) if d == target]
+        return [code for code, d in enumerate(self.domains) if regex.search(d)]
+
+    def mask(self, pattern):
+        """Get a boolean row mask of emails whose domain matches pattern"""
+        import numpy as np
+
+        selected = np.zeros(len(self.domains), dtype=bool)
+        selected[self.pattern_codes(pattern)] = True
+        return selected[self.codes]
+
+    def registrable_domains(self):
+        """Get the registrable domain of every row, computed once per domain"""
+        import numpy as np
+
+        registrable = np.array(
+            [registrable_domain(domain) for domain in self.domains], dtype=object
+        )
+        return registrable[self.codes]
+
+
+def domain_index(emails, column="from_domain"):
+    """Get the DomainIndex of a domain column, built once per loaded dataset
+
+    Frames from the shared dataset registry, and their date windows, take
+    their rows from one cached index per column; other frames get their own.
+    """
+    source = dataset_source(emails)
+    if source is None:
+        return DomainIndex(emails[column])
+    cache, frame, rows = source
+    key = ("domain_index", column)
+    if key not in cache:
+        cache[key] = DomainIndex(frame[column])
+    return cache[key] if rows is None else cache[key].take(rows)
+
+
+def with_registrable_domain(emails):
+    """Ensure emails carry a registrable_domain column
+
+    Rollups only know the multi-label suffixes in MULTI_LABEL_SUFFIXES.
+    """
+    if "registrable_domain" in emails.columns:
+        return emails
+    registrable = domain_index(emails).registrable_domains()
+    return track_rows(emails, emails.assign(registrable_domain=registrable))
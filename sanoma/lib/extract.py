@@ -1,9 +1,15 @@
+import json
+import os
 import re
 import sqlite3
 from pathlib import Path
 
 from sanoma.lib.output import write_data
 from sanoma.lib.config import get_extraction_filters, should_filter_email
+from sanoma.lib.dataset import dataset_version, iter_records
+from sanoma.lib.dates import bound_micros, date_bounds
+from sanoma.lib.domains import registrable_domain
+from sanoma.lib.progress import Progress
 
 
 def extract_domain(email_addr):
@@ -21,8 +27,74 @@ def extract_domain(email_addr):
     return "malformed"
 
 
-def extract_complete_dataset(profile_path, output_file, config=None):
-    """Extract complete email dataset from Gloda"""
+def extract_state_path(output_file):
+    """Get the sidecar file recording what an extract output already holds"""
+    return Path(f"{output_file}.state.json")
+
+
+def load_extract_state(output_file, db_path, filters):
+    """Load the sidecar of a previous extract, if it still describes the output
+
+    The state is stale when the output was rewritten by something else, or
+    was extracted from another database or with other filters.
+    """
+    try:
+        with open(extract_state_path(output_file)) as f:
+            state = json.load(f)
+        version = dataset_version(output_file)
+    except (OSError, ValueError):
+        return None
+    if (
+        state.get("version") != version
+        or state.get("db") != str(db_path.resolve())
+        or state.get("filters") != json.dumps(filters, sort_keys=True, default=str)
+    ):
+        return None
+    return state
+
+
+def save_extract_state(output_file, db_path, filters, max_id):
+    """Record the highest extracted message id next to the output"""
+    state = {
+        "db": str(db_path.resolve()),
+        "filters": json.dumps(filters, sort_keys=True, default=str),
+        "max_id": max_id,
+        "version": dataset_version(output_file),
+    }
+    path = extract_state_path(output_file)
+    temp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(temp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(temp_path, path)
+
+
+def merge_newest_first(new_emails, existing_emails):
+    """Merge two date-descending email lists, new emails first on ties
+
+    New messages have higher Gloda ids, which is how a full extract orders
+    messages with equal dates.
+    """
+    merged = []
+    existing = iter(existing_emails)
+    current = next(existing, None)
+    for email in new_emails:
+        while current is not None and current["date"] > email["date"]:
+            merged.append(current)
+            current = next(existing, None)
+        merged.append(email)
+    if current is not None:
+        merged.append(current)
+        merged.extend(existing)
+    return merged
+
+
+def extract_complete_dataset(profile_path, output_file, config=None, incremental=False):
+    """Extract complete email dataset from Gloda
+
+    With ``incremental``, only messages added since the previous extract to
+    the same output are read and merged into it. Gloda ids only grow, so
+    this picks up new mail; deletions and folder moves need a full extract.
+    """
     db_path = Path(profile_path) / "global-messages-db.sqlite"
     if not db_path.exists():
         raise FileNotFoundError(f"Gloda database not found at {db_path}")
@@ -30,9 +102,34 @@ def extract_complete_dataset(profile_path, output_file, config=None):
     conn = sqlite3.connect(str(db_path))
     cursor = conn.cursor()
 
-    sql = """
+    filters = get_extraction_filters(config or {})
+    state = load_extract_state(output_file, db_path, filters) if incremental else None
+
+    # Messages indexed while extracting are left for the next run.
+    max_id = cursor.execute("SELECT MAX(id) FROM messages").fetchone()[0] or 0
+    if state is not None and state["max_id"] >= max_id:
+        conn.close()
+        print(f"No new emails since the last extract to {output_file}")
+        return
+
+    # Config date ranges are applied in SQL on the indexed microsecond date.
+    conditions = ["m.id <= ?"]
+    params = [max_id]
+    if state is not None:
+        conditions.append("m.id > ?")
+        params.append(state["max_id"])
+    if filters.get("date_after") or filters.get("date_before"):
+        lower, upper = date_bounds(
+            filters.get("date_after"), filters.get("date_before")
+        )
+        conditions.append("m.date >= ? AND m.date < ?")
+        params.extend([bound_micros(lower), bound_micros(upper)])
+    where = "WHERE " + " AND ".join(conditions)
+
+    sql = f"""
         SELECT
             m.headerMessageID,
+            m.conversationID,
             datetime(m.date/1000000, 'unixepoch') as date_formatted,
             t.c3author as from_field,
             t.c4recipients as to_field,
@@ -42,32 +139,57 @@ def extract_complete_dataset(profile_path, output_file, config=None):
         FROM messages m
         LEFT JOIN messagesText_content t ON m.id = t.docid
         LEFT JOIN folderLocations fl ON m.folderID = fl.id
-        ORDER BY m.date DESC
+        {where}
+        ORDER BY m.date DESC, m.id DESC
     """
 
-    print("Extracting complete dataset from Thunderbird Gloda...")
-    cursor.execute(sql)
-    rows = cursor.fetchall()
-
-    filters = get_extraction_filters(config or {})
+    if state is not None:
+        print(f"Extracting emails added since message {state['max_id']}...")
+    else:
+        print("Extracting complete dataset from Thunderbird Gloda...")
+    total = cursor.execute(
+        f"SELECT COUNT(*) FROM messages m {where}", params
+    ).fetchone()[0]
+    progress = Progress("Extracting", total)
+    cursor.execute(sql, params)
 
     emails = []
     filtered_count = 0
-    for row in rows:
-        (msg_id, date, from_field, to_field, subject, body_text, folder_path) = row
+    registrable = {}
+    for row in cursor:
+        (
+            msg_id,
+            conversation_id,
+            date,
+            from_field,
+            to_field,
+            subject,
+            body_text,
+            folder_path,
+        ) = row
+        from_domain = extract_domain(from_field or "")
+        if from_domain not in registrable:
+            registrable[from_domain] = registrable_domain(from_domain)
         email = {
             "message_id": (
                 f"<{msg_id}>" if msg_id and not msg_id.startswith("<") else msg_id or ""
             ),
+            "conversation_id": conversation_id,
             "date": date or "",
             "from": from_field or "",
-            "from_domain": extract_domain(from_field or ""),
+            "from_domain": from_domain,
+            "registrable_domain": registrable[from_domain],
             "to": to_field or "",
             "subject": subject or "",
             "folder": folder_path or "",
             "body": body_text or "",
             "has_body": bool(body_text),
         }
+        progress.update(
+            bytes_read=sum(
+                len(field or "") for field in (from_field, to_field, subject, body_text)
+            )
+        )
 
         if should_filter_email(email, filters):
             filtered_count += 1
@@ -75,13 +197,19 @@ def extract_complete_dataset(profile_path, output_file, config=None):
 
         emails.append(email)
 
+    progress.finish()
     conn.close()
 
+    new_count = len(emails)
+    if state is not None:
+        emails = merge_newest_first(emails, iter_records(output_file))
     format_used = write_data(emails, output_file, "json")
+    save_extract_state(output_file, db_path, filters, max_id)
 
     with_bodies = sum(1 for e in emails if e["has_body"])
     filter_msg = f" (filtered out {filtered_count})" if filtered_count > 0 else ""
+    added_msg = f", {new_count} new" if state is not None else ""
     print(
-        f"Extracted {len(emails)} emails ({with_bodies} with bodies) "
+        f"Extracted {len(emails)} emails ({with_bodies} with bodies{added_msg}) "
         f"to {output_file} ({format_used}){filter_msg}"
     )
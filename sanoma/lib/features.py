@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Hashed word and bigram count features as persisted CSR arrays
+"""
+
+import hashlib
+import os
+import zlib
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from sanoma.lib.dataset import dataset_version, load_emails
+from sanoma.lib.dates import date_window
+
+FEATURE_VERSION = 1
+HASH_BITS = 18
+# Odd multipliers for multiply-shift hashing of unigrams and bigrams.
+UNIGRAM_MIX = np.uint64(0x9E3779B97F4A7C15)
+BIGRAM_MIX = np.uint64(0xC2B2AE3D27D4EB4F)
+FEATURE_ARRAYS = ["indptr", "indices", "data"]
+
+
+def token_hashes(texts):
+    """Tokenize texts into words, returning per-word hashes and owning rows"""
+    tokens = texts.fillna("").astype(str).str.lower().str.findall(r"\w+")
+    lengths = tokens.str.len().to_numpy()
+    words = tokens.explode().dropna()
+    codes, vocabulary = pd.factorize(words.to_numpy(dtype=object))
+    hashes = np.array(
+        [zlib.crc32(word.encode()) for word in vocabulary], dtype=np.uint64
+    )[codes]
+    return hashes, np.repeat(np.arange(len(lengths)), lengths)
+
+
+def build_features(texts, bits=HASH_BITS):
+    """Count hashed unigrams and bigrams per text as CSR arrays
+
+    Returns a dict with ``indptr``, ``indices`` (feature ids below 2**bits)
+    and ``data`` (counts), one row per text.
+    """
+    hashes, owners = token_hashes(texts)
+    shift = np.uint64(64 - bits)
+    unigrams = (hashes * UNIGRAM_MIX) >> shift
+    same_text = owners[1:] == owners[:-1]
+    bigrams = ((hashes[:-1] * BIGRAM_MIX + hashes[1:]) * UNIGRAM_MIX) >> shift
+
+    size = np.int64(1) << bits
+    keys = np.concatenate(
+        [
+            owners * size + unigrams.astype(np.int64),
+            owners[:-1][same_text] * size + bigrams[same_text].astype(np.int64),
+        ]
+    )
+    # Sorted unique (row, feature) keys are already in CSR order.
+    keys, counts = np.unique(keys, return_counts=True)
+    rows = np.bincount(keys // size, minlength=len(texts))
+    return {
+        "indptr": np.concatenate(([0], np.cumsum(rows))),
+        "indices": (keys % size).astype(np.int32),
+        "data": counts.astype(np.uint32),
+    }
+
+
+def row_ids(features):
+    """Get the row of every stored entry"""
+    return np.repeat(
+        np.arange(len(features["indptr"]) - 1), np.diff(features["indptr"])
+    )
+
+
+def feature_cache_path(cache_dir, input_file, since=None, until=None):
+    """Get the feature cache file for a dataset and date window"""
+    key = f"{FEATURE_VERSION}:{HASH_BITS}:{Path(input_file).resolve()}:{since}:{until}"
+    return Path(cache_dir) / f"{hashlib.sha1(key.encode()).hexdigest()[:16]}.npz"
+
+
+def load_feature_cache(path, version, rows):
+    """Load cached features if built from this dataset version"""
+    try:
+        with np.load(path) as cached:
+            if str(cached["version"]) != version:
+                return None
+            features = {name: cached[name] for name in FEATURE_ARRAYS}
+    except (OSError, KeyError, ValueError):
+        return None
+    return features if len(features["indptr"]) == rows + 1 else None
+
+
+def save_feature_cache(path, features, version):
+    """Write a feature cache file atomically"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_suffix(".tmp.npz")
+    np.savez(temp_path, version=np.array(version), **features)
+    os.replace(temp_path, path)
+
+
+def load_features(input_file, cache_dir=None, since=None, until=None, columns=()):
+    """Load a dataset with its feature matrix, reusing cached features
+
+    Features cover subject and body; rows follow the dataset order after the
+    date window. They are rebuilt only when the dataset file changes.
+    """
+    version = dataset_version(input_file)
+    emails = load_emails(input_file, {"date", "subject", "body", *columns})
+    emails = date_window(emails, since, until).reset_index(drop=True)
+
+    path = (
+        feature_cache_path(cache_dir, input_file, since, until) if cache_dir else None
+    )
+    features = load_feature_cache(path, version, len(emails.index)) if path else None
+    if features is not None:
+        print(f"Reusing cached features {path}")
+        return emails, features
+
+    texts = (
+        emails["subject"].fillna("").astype(str)
+        + " "
+        + emails["body"].fillna("").astype(str)
+    )
+    features = build_features(texts)
+    if path:
+        save_feature_cache(path, features, version)
+    return emails, features
@@ -7,6 +7,8 @@ import json
 import csv
 from pathlib import Path
 
+from sanoma.lib.dataset import forget_dataset
+
 
 def write_json(data, output_file):
     """Write data as JSON"""
@@ -62,6 +64,10 @@ def write_data(data, output_file, format_type=None):
         else:
             format_type = "json"
 
+    # Shared in-process readers must not see the old contents of this path.
+    forget_dataset(output_file)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
     if format_type == "json":
         write_json(data, output_file)
     elif format_type == "csv":
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Required-literal prefiltering for regex searches over email text
+"""
+
+import re
+import warnings
+
+import pandas as pd
+
+try:
+    from re import _parser as sre_parse  # Python 3.11+
+except ImportError:  # pragma: no cover - Python 3.10
+    import sre_parse  # type: ignore[no-redef]
+
+
+# Cap on alternative literals tracked per node before giving up on exactness.
+MAX_ALTERNATIVES = 64
+# Largest character class expanded into single-character literals.
+MAX_CLASS_SIZE = 8
+
+# Characters that match an ASCII letter under re.IGNORECASE but whose
+# casefold() does not produce that letter.
+FOLD_TABLE = str.maketrans({"İ": "i", "ı": "i"})
+
+ZERO_WIDTH = frozenset([""])
+
+
+def _best(candidates):
+    """Pick the most selective literal set (longest shortest alternative)"""
+    usable = [c for c in candidates if c and "" not in c]
+    if not usable:
+        return None
+    return max(usable, key=lambda c: (min(len(s) for s in c), -len(c)))
+
+
+def _sequence(items, fold):
+    """Analyze a sequence of parsed nodes, returning (exact, required)"""
+    run = ZERO_WIDTH
+    complete = True
+    candidates = []
+    for op, av in items:
+        exact, required = _node(op, av, fold)
+        if exact is not None:
+            joined = frozenset(a + b for a in run for b in exact)
+            if len(joined) <= MAX_ALTERNATIVES:
+                run = joined
+                continue
+        complete = False
+        candidates.append(run)
+        if required is not None:
+            candidates.append(required)
+        run = exact if exact is not None else ZERO_WIDTH
+    candidates.append(run)
+    return (run if complete else None), _best(candidates)
+
+
+def _node(op, av, fold):
+    """Analyze one parsed node, returning (exact, required)
+
+    ``exact`` is the full set of strings the node can match, ``required`` is a
+    set of literals at least one of which every match must contain. Either may
+    be None when it cannot be determined.
+    """
+    if op is sre_parse.LITERAL:
+        char = chr(av)
+        if fold:
+            if not char.isascii():
+                return None, None
+            char = char.lower()
+        return frozenset([char]), None
+
+    if op in (sre_parse.AT, sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+        # Zero-width: anchors, word boundaries and lookarounds.
+        return ZERO_WIDTH, None
+
+    if op is sre_parse.SUBPATTERN:
+        _, add_flags, del_flags, pattern = av
+        if (add_flags | del_flags) & re.IGNORECASE:
+            return None, None
+        return _sequence(pattern, fold)
+
+    if op is getattr(sre_parse, "ATOMIC_GROUP", None):
+        return _sequence(av, fold)
+
+    if op is sre_parse.BRANCH:
+        results = [_sequence(branch, fold) for branch in av[1]]
+        exact = None
+        if all(e is not None for e, _ in results):
+            union = frozenset().union(*(e for e, _ in results))
+            if len(union) <= MAX_ALTERNATIVES:
+                exact = union
+        branch_sets = [e if e is not None else r for e, r in results]
+        if any(s is None or "" in s for s in branch_sets):
+            return exact, None
+        return exact, frozenset().union(*branch_sets)
+
+    if op is sre_parse.IN:
+        if len(av) > MAX_CLASS_SIZE or any(o is not sre_parse.LITERAL for o, _ in av):
+            return None, None
+        chars = [chr(code) for _, code in av]
+        if fold:
+            if not all(c.isascii() for c in chars):
+                return None, None
+            chars = [c.lower() for c in chars]
+        return frozenset(chars), None
+
+    if op in (
+        sre_parse.MAX_REPEAT,
+        sre_parse.MIN_REPEAT,
+        getattr(sre_parse, "POSSESSIVE_REPEAT", None),
+    ):
+        low, high, pattern = av
+        if low < 1:
+            return None, None
+        exact, required = _sequence(pattern, fold)
+        if exact is not None and low == high and len(exact) ** low <= MAX_ALTERNATIVES:
+            repeated = ZERO_WIDTH
+            for _ in range(low):
+                repeated = frozenset(a + b for a in repeated for b in exact)
+            return repeated, None
+        return None, _best([exact, required])
+
+    return None, None
+
+
+def required_literals(regex):
+    """Return literals one of which every match of regex must contain
+
+    Literals are lowercased when the regex is case-insensitive. Returns None
+    when no useful literal can be extracted.
+    """
+    if not isinstance(regex.pattern, str):
+        return None
+    try:
+        parsed = sre_parse.parse(regex.pattern, regex.flags)
+    except (re.error, RecursionError):
+        return None
+    fold = bool(parsed.state.flags & re.IGNORECASE)
+    exact, required = _sequence(parsed, fold)
+    best = _best([exact, required])
+    return tuple(sorted(best)) if best else None
+
+
+def fold_case(texts):
+    """Case-fold a text series for case-insensitive literal checks"""
+    return texts.fillna("").astype(str).str.translate(FOLD_TABLE).str.casefold()
+
+
+def _search(texts, regex):
+    """Run regex search over texts, ignoring pandas' match-group warning"""
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message=".*has match groups.*")
+        return texts.str.contains(regex, na=False)
+
+
+def prefiltered_contains(texts, regex, folded=None):
+    """Search texts for regex, skipping rows that lack its required literals
+
+    Returns the boolean match mask and the number of rows the literal
+    prefilter rejected without running the regex. Pass ``folded`` to reuse a
+    ``fold_case`` result across several case-insensitive patterns.
+    """
+    texts = texts.fillna("").astype(str)
+    literals = required_literals(regex)
+    if literals is None:
+        return _search(texts, regex), 0
+
+    if regex.flags & re.IGNORECASE:
+        haystack = folded if folded is not None else fold_case(texts)
+    else:
+        haystack = texts
+    candidates = pd.Series(False, index=texts.index)
+    for literal in literals:
+        candidates |= haystack.str.contains(literal, regex=False, na=False)
+
+    mask = pd.Series(False, index=texts.index)
+    if candidates.any():
+        mask[candidates] = _search(texts[candidates], regex)
+    return mask, int((~candidates).sum())
+
+
+def format_skipped(skipped, total, unit="rows"):
+    """Describe the share of rows the prefilter skipped"""
+    share = skipped / total * 100 if total else 0.0
+    return f"Literal prefilter skipped {skipped}/{total} {unit} ({share:.1f}%)"
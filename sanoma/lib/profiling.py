@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Per-step resource profiles for workflow runs
+"""
+
+import csv
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+from sanoma.lib.dataset import iter_records, loaded_rows
+
+try:
+    import resource
+except ImportError:  # Windows has no resource module
+    resource = None
+
+
+def usage():
+    """Snapshot wall clock, this thread's CPU time and child-process usage"""
+    snapshot = {"wall": time.perf_counter(), "cpu": time.thread_time()}
+    if resource is not None:
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        snapshot["child_cpu"] = children.ru_utime + children.ru_stime
+    return snapshot
+
+
+# Seconds between RSS samples while a step runs.
+SAMPLE_INTERVAL = 0.1
+MB = 1 << 20
+
+
+def process_table():
+    """Map each running pid to its parent pid and resident bytes via /proc"""
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    table = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # Fields after the parenthesized command name: state, ppid, ... rss.
+        fields = stat[stat.rindex(")") + 2 :].split()
+        table[int(entry)] = (int(fields[1]), int(fields[21]) * page_size)
+    return table
+
+
+def tree_rss():
+    """Get the resident bytes of this process and all its descendants
+
+    Returns None where /proc is unavailable.
+    """
+    try:
+        table = process_table()
+    except (OSError, ValueError, IndexError):
+        return None
+    children = {}
+    for pid, (ppid, _) in table.items():
+        children.setdefault(ppid, []).append(pid)
+    total = 0
+    pending = [os.getpid()]
+    while pending:
+        pid = pending.pop()
+        total += table.get(pid, (0, 0))[1]
+        pending.extend(children.get(pid, []))
+    return total
+
+
+class RssSampler:
+    """Sample the RSS of this process tree in the background to find a peak
+
+    Child processes (subprocess steps, worker pools) are included. The peak
+    is only the step's own when no other step runs at the same time.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stop = threading.Event()
+        self.start = self.peak = None
+
+    def sample(self):
+        rss = tree_rss()
+        if rss is not None:
+            self.peak = rss if self.peak is None else max(self.peak, rss)
+        return rss
+
+    def run(self):
+        while not self.stop.wait(self.interval):
+            self.sample()
+
+    def __enter__(self):
+        self.start = self.sample()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop.set()
+        self.thread.join()
+        self.sample()
+
+
+def peak_rss_mb():
+    """Get the process high-water RSS of this process or its children in MB
+
+    The mark only ever rises and is shared by everything the process ran, so
+    it describes the whole run rather than a single step.
+    """
+    if resource is None:
+        return None
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere.
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+
+def file_rows(path):
+    """Count records in a dataset or analysis file, or None if not tabular
+
+    Datasets held by the shared registry are counted without reading them,
+    and JSON files that are not arrays are skipped without being parsed.
+    """
+    rows = loaded_rows(path)
+    if rows is not None:
+        return rows
+    if path.endswith(".csv"):
+        with open(path, newline="") as f:
+            return max(sum(1 for _ in csv.reader(f)) - 1, 0)
+    if path.endswith(".json"):
+        with open(path) as f:
+            head = f.read(4096).lstrip()
+        if not head.startswith("["):
+            return None
+        try:
+            return sum(1 for _ in iter_records(path))
+        except ValueError:
+            return None
+    return None
+
+
+def path_stats(path):
+    """Describe a step input or output by size and row count"""
+    if os.path.isdir(path):
+        files = [file for file in Path(path).rglob("*") if file.is_file()]
+        return {
+            "path": path,
+            "bytes": sum(file.stat().st_size for file in files),
+            "files": len(files),
+        }
+    if not os.path.exists(path):
+        return {"path": path, "bytes": None, "rows": None}
+    return {"path": path, "bytes": os.path.getsize(path), "rows": file_rows(path)}
+
+
+def step_profile(start, inputs, outputs, rss=None):
+    """Measure a finished step against its starting usage snapshot
+
+    CPU time covers the worker thread plus child processes; child usage is
+    process-wide, so it is only exact when steps do not overlap. With an
+    RssSampler, peak RSS is the highest sample taken during the step and
+    growth is that peak minus the RSS the step started from.
+    """
+    end = usage()
+    cpu = end["cpu"] - start["cpu"]
+    if "child_cpu" in end:
+        cpu += end["child_cpu"] - start["child_cpu"]
+    peak = growth = None
+    if rss is not None and rss.peak is not None:
+        peak = rss.peak / MB
+        growth = (rss.peak - rss.start) / MB
+    return {
+        "wall_seconds": end["wall"] - start["wall"],
+        "cpu_seconds": cpu,
+        "peak_rss_mb": peak,
+        "rss_growth_mb": growth,
+        "inputs": [path_stats(path) for path in sorted(inputs)],
+        "outputs": [path_stats(path) for path in sorted(outputs)],
+    }
+
+
+def total_rows(stats):
+    """Sum known row counts of step inputs or outputs"""
+    rows = [entry["rows"] for entry in stats if entry.get("rows") is not None]
+    return sum(rows) if rows else None
+
+
+def print_profile(steps):
+    """Print step profiles as a table, slowest first"""
+    print("\nStep profile (slowest first):")
+    print(
+        f"  {'wall s':>8} {'cpu s':>8} {'peak MB':>8} {'+MB':>7} {'rows in':>9} "
+        f"{'rows out':>9}  step"
+    )
+    ranked = sorted(steps, key=lambda step: -(step.get("wall_seconds") or 0))
+    for step in ranked:
+        if "wall_seconds" not in step:
+            print(
+                f"  {'-':>8} {'-':>8} {'-':>8} {'-':>7} {'-':>9} {'-':>9}  "
+                f"{step['name']}"
+            )
+            continue
+        rows_in = total_rows(step["inputs"])
+        rows_out = total_rows(step["outputs"])
+        peak = step["peak_rss_mb"]
+        growth = step["rss_growth_mb"]
+        print(
+            f"  {step['wall_seconds']:>8.2f} {step['cpu_seconds']:>8.2f} "
+            f"{'-' if peak is None else f'{peak:.0f}':>8} "
+            f"{'-' if growth is None else f'{growth:+.0f}':>7} "
+            f"{'-' if rows_in is None else rows_in:>9} "
+            f"{'-' if rows_out is None else rows_out:>9}  {step['name']}"
+        )
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Throttled progress and throughput reporting for long-running operations
+"""
+
+import sys
+import time
+
+# Seconds between progress lines; jobs that finish sooner print nothing.
+DEFAULT_INTERVAL = 1.0
+# Rows per chunk when a vectorized job is split up so it can report progress.
+CHUNK_SIZE = 5000
+
+
+def format_bytes(count):
+    """Format a byte count with a binary unit"""
+    for unit in ["B", "KB", "MB", "GB"]:
+        if count < 1024 or unit == "GB":
+            break
+        count /= 1024
+    return f"{count:.0f} {unit}" if unit == "B" else f"{count:.1f} {unit}"
+
+
+def format_duration(seconds):
+    """Format seconds as M:SS, or H:MM:SS past an hour"""
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+
+def text_bytes(*columns):
+    """Size the text a search scans, as characters of string columns"""
+    return int(sum(column.fillna("").astype(str).str.len().sum() for column in columns))
+
+
+class Progress:
+    """Report rows processed, throughput, bytes read and ETA on stderr
+
+    A line is written at most once per ``interval`` seconds. Its rate covers
+    only the time since the previous line, so a sudden throughput collapse
+    (a pathological regex, a slow disk) shows up right away. Terminals get
+    the line redrawn in place; pipes and logs get one line per report.
+    """
+
+    def __init__(self, label, total=None, unit="rows", interval=DEFAULT_INTERVAL):
+        self.label = label
+        self.total = total
+        self.unit = unit
+        self.interval = interval
+        self.rows = 0
+        self.bytes = 0
+        self.start = self.last_time = time.monotonic()
+        self.last_rows = 0
+        self.reported = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.finish()
+
+    def update(self, rows=1, bytes_read=0):
+        """Count processed rows and bytes, reporting if the interval passed"""
+        self.rows += rows
+        self.bytes += bytes_read
+        now = time.monotonic()
+        # The closing summary covers the last rows.
+        if now - self.last_time >= self.interval and self.rows != self.total:
+            self.report(now)
+
+    def finish(self):
+        """Print a closing summary if any progress line was shown"""
+        if self.reported:
+            self.report(time.monotonic(), final=True)
+
+    def report(self, now, final=False):
+        since = self.start if final else self.last_time
+        rows = self.rows if final else self.rows - self.last_rows
+        rate = rows / (now - since) if now > since else 0.0
+
+        done = f"{self.rows:,}"
+        if self.total:
+            done += f"/{self.total:,} {self.unit} ({self.rows / self.total:.0%})"
+        else:
+            done += f" {self.unit}"
+        parts = [f"{self.label}: {done}", f"{rate:,.0f} {self.unit}/s"]
+        if self.bytes:
+            parts.append(format_bytes(self.bytes))
+        if final:
+            parts.append(f"done in {format_duration(now - self.start)}")
+        elif self.total and rate > 0:
+            eta = max(self.total - self.rows, 0) / rate
+            parts.append(f"ETA {format_duration(eta)}")
+        line = " | ".join(parts)
+
+        stream = sys.stderr
+        if getattr(stream, "isatty", lambda: False)():
+            end = "\n" if final else ""
+            stream.write(f"\r\033[K{line}{end}")
+        else:
+            stream.write(f"{line}\n")
+        stream.flush()
+        self.last_time = now
+        self.last_rows = self.rows
+        self.reported = True
@@ -2,16 +2,20 @@ import re
 
 import pandas as pd
 
+from sanoma.lib.dataset import load_emails
+from sanoma.lib.dates import date_window
+from sanoma.lib.prefilter import format_skipped, prefiltered_contains
+from sanoma.lib.progress import CHUNK_SIZE, Progress, text_bytes
 
-def query_emails(input_file, pattern=None, case_sensitive=False):
+
+def query_emails(
+    input_file, pattern=None, case_sensitive=False, since=None, until=None
+):
     """Query emails matching pattern, return matching emails"""
-    emails = pd.read_json(input_file)
     required_columns = {"subject", "body", "has_body"}
-    missing_columns = required_columns.difference(emails.columns)
-    if missing_columns:
-        raise ValueError(
-            f"Missing required columns in JSON: {', '.join(sorted(missing_columns))}"
-        )
+    if since or until:
+        required_columns.add("date")
+    emails = date_window(load_emails(input_file, required_columns), since, until)
 
     if not pattern:
         return emails.to_dict(orient="records")
@@ -20,9 +24,21 @@ def query_emails(input_file, pattern=None, case_sensitive=False):
     # Pattern search across subject and body.
     regex = re.compile(pattern, flags)
 
-    subject_mask = (
-        emails["subject"].fillna("").astype(str).str.contains(regex, na=False)
-    )
-    body_mask = emails["body"].fillna("").astype(str).str.contains(regex, na=False)
-    mask = subject_mask | (body_mask & emails["has_body"].astype(bool))
-    return emails[mask].to_dict(orient="records")
+    masks = []
+    skipped = 0
+    with Progress("Searching", len(emails.index)) as progress:
+        for start in range(0, len(emails.index), CHUNK_SIZE):
+            chunk = emails.iloc[start : start + CHUNK_SIZE]
+            subject_mask, subject_skipped = prefiltered_contains(
+                chunk["subject"], regex
+            )
+            body_mask, body_skipped = prefiltered_contains(chunk["body"], regex)
+            masks.append(subject_mask | (body_mask & chunk["has_body"].astype(bool)))
+            skipped += subject_skipped + body_skipped
+            progress.update(
+                len(chunk.index), text_bytes(chunk["subject"], chunk["body"])
+            )
+    print(format_skipped(skipped, 2 * len(emails.index)))
+    if not masks:
+        return []
+    return emails[pd.concat(masks)].to_dict(orient="records")
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Resident server that keeps datasets loaded between sanoma commands
+"""
+
+import hmac
+import http.client
+import json
+import os
+import secrets
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# CLI commands the thin client forwards to a running server.
+REMOTE_COMMANDS = ["filter", "query", "stats", "cube", "workflow"]
+# Per-server tokens live under the served directory, readable only by the user.
+TOKEN_DIR = Path("cache/server")
+LOCAL_HOSTS = ["127.0.0.1", "localhost", "[::1]"]
+
+
+def token_path(port):
+    """Get the token file for a server on this port in the current directory"""
+    return TOKEN_DIR / f"{port}.token"
+
+
+def write_token(port):
+    """Create a fresh random token in a 0600 file and return it"""
+    TOKEN_DIR.mkdir(mode=0o700, parents=True, exist_ok=True)
+    path = token_path(port)
+    path.unlink(missing_ok=True)
+    token = secrets.token_urlsafe(32)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w") as f:
+        f.write(token)
+    return token
+
+
+def read_token(port):
+    """Read the token of a server on this port, or None if none runs here"""
+    try:
+        return token_path(port).read_text().strip() or None
+    except OSError:
+        return None
+
+
+def allowed_command(command):
+    """Check that a request names a sanoma CLI command or sanoma tool module"""
+    if not isinstance(command, list) or not command:
+        return False
+    if command[0] == "sanoma":
+        if len(command) < 2 or command[1] not in REMOTE_COMMANDS:
+            return False
+        # A watch never returns; argparse accepts any prefix of --watch.
+        return command[1] != "workflow" or not any(
+            len(str(argument)) > 2 and "--watch".startswith(str(argument))
+            for argument in command[2:]
+        )
+    return (
+        len(command) > 2
+        and command[1] == "-m"
+        and str(command[2]).startswith(("sanoma.analysis.", "sanoma.plot."))
+    )
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """Answer status and command requests against the resident datasets
+
+    Every request must name the server in its Host header (so DNS rebinding
+    fails) and carry the server's token, which only local processes that can
+    read the 0600 token file know. Commands must be posted as JSON, which a
+    cross-site form cannot send.
+    """
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def authorized(self):
+        """Check the Host header and token, answering the request if they fail"""
+        host, port = self.server.server_address[:2]
+        allowed = {f"{name}:{port}" for name in [*LOCAL_HOSTS, host]}
+        if self.headers.get("Host") not in allowed:
+            self.send_json(403, {"error": "Unexpected Host header"})
+            return False
+        expected = f"Bearer {self.server.token}"
+        if not hmac.compare_digest(self.headers.get("Authorization", ""), expected):
+            self.send_json(401, {"error": "Missing or invalid server token"})
+            return False
+        return True
+
+    def do_GET(self):
+        if not self.authorized():
+            return
+        if self.path != "/status":
+            self.send_json(404, {"error": f"Unknown path: {self.path}"})
+            return
+        from sanoma.lib.dataset import loaded_datasets
+
+        self.send_json(200, {"datasets": loaded_datasets()})
+
+    def do_POST(self):
+        if not self.authorized():
+            return
+        if self.path != "/run":
+            self.send_json(404, {"error": f"Unknown path: {self.path}"})
+            return
+        content_type = self.headers.get("Content-Type", "").split(";")[0].strip()
+        if content_type != "application/json":
+            self.send_json(415, {"error": "Request body must be application/json"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length))
+        except ValueError:
+            self.send_json(400, {"error": "Request body must be JSON"})
+            return
+
+        command = request.get("command")
+        if not allowed_command(command):
+            self.send_json(400, {"error": f"Unsupported command: {command}"})
+            return
+        # Relative paths in the command resolve against the server's directory.
+        if request.get("cwd") != os.getcwd():
+            self.send_json(409, {"error": f"Server runs in {os.getcwd()}"})
+            return
+
+        from sanoma.lib.workflow import run_in_process
+
+        returncode, stdout, stderr = run_in_process([str(arg) for arg in command])
+        self.send_json(
+            200, {"returncode": returncode, "stdout": stdout, "stderr": stderr}
+        )
+
+    def log_message(self, format, *args):
+        print(f"{self.address_string()} {format % args}")
+
+
+def watch_datasets(stop, interval):
+    """Reload changed datasets in the background until stopped"""
+    from sanoma.lib.dataset import refresh_datasets
+
+    while not stop.wait(interval):
+        for path in refresh_datasets():
+            print(f"Reloaded {path}")
+
+
+def serve(datasets=(), host=DEFAULT_HOST, port=DEFAULT_PORT, interval=2.0):
+    """Load datasets once and serve sanoma commands over localhost HTTP"""
+    # The client side of this module stays free of pandas imports.
+    from sanoma.lib.dataset import load_emails, shared_datasets
+
+    with shared_datasets():
+        for path in datasets:
+            rows = len(load_emails(path).index)
+            print(f"Loaded {path} ({rows} emails)")
+
+        stop = threading.Event()
+        watcher = threading.Thread(
+            target=watch_datasets, args=(stop, interval), daemon=True
+        )
+        watcher.start()
+        server = ThreadingHTTPServer((host, port), RequestHandler)
+        server.token = write_token(port)
+        print(f"Serving on http://{host}:{port} from {os.getcwd()}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stop.set()
+            server.server_close()
+            token_path(port).unlink(missing_ok=True)
+
+
+def run_remote(server, command, timeout=3600):
+    """Run a command on a sanoma server, or return None if it cannot
+
+    None means no server runs in this directory: there is no token file, the
+    connection was refused, or the server declined before running anything
+    (wrong directory). The caller should then run the command locally. Any
+    failure once the command may have started raises, so it never runs twice.
+    """
+    url = urllib.parse.urlsplit(server)
+    token = read_token(url.port or DEFAULT_PORT)
+    if token is None:
+        return None
+    request = urllib.request.Request(
+        f"{server.rstrip('/')}/run",
+        data=json.dumps({"command": command, "cwd": os.getcwd()}).encode(),
+        headers={
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {token}",
+        },
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        if e.code == 409:
+            return None
+        raise RuntimeError(f"Server at {server} rejected the command: {e}") from e
+    except urllib.error.URLError as e:
+        if isinstance(e.reason, ConnectionRefusedError):
+            return None
+        raise RuntimeError(f"Server at {server} failed: {e.reason}") from e
+    except (OSError, ValueError, http.client.HTTPException) as e:
+        raise RuntimeError(
+            f"Server at {server} failed while running the command: {e}"
+        ) from e
@@ -1,23 +1,95 @@
-import pandas as pd
+from collections import Counter
 
+from sanoma.lib.cube import load_counts
+from sanoma.lib.dataset import iter_email_chunks
+from sanoma.lib.dates import date_window
+from sanoma.lib.sketch import (
+    DEFAULT_CAPACITY,
+    DEFAULT_CHUNK_SIZE,
+    HyperLogLog,
+    SpaceSaving,
+)
 
-def stats(input_file):
-    """Show dataset statistics"""
-    emails = pd.read_json(input_file)
-    required_columns = {"from_domain", "date", "folder", "has_body"}
-    missing_columns = required_columns.difference(emails.columns)
-    if missing_columns:
-        raise ValueError(
-            f"Missing required columns in JSON: {', '.join(sorted(missing_columns))}"
-        )
+STATS_COLUMNS = {"from_domain", "date", "folder", "has_body"}
 
-    domains = emails["from_domain"].astype(str).value_counts()
-    years = emails["date"].astype(str).str.slice(0, 4).replace("", "unknown")
-    years = years.value_counts()
-    with_bodies = int(emails["has_body"].astype(bool).sum())
+
+def year_labels(emails):
+    """Get the year of every email, or "unknown" when the date is empty"""
+    return emails["date"].astype(str).str.slice(0, 4).replace("", "unknown")
+
+
+def empty_stats(capacity=DEFAULT_CAPACITY):
+    """Get partial statistics for no emails, the identity for merge_stats"""
+    return {
+        "total": 0,
+        "with_bodies": 0,
+        "years": Counter(),
+        "top_domains": SpaceSaving(capacity),
+        "unique_domains": HyperLogLog(),
+    }
+
+
+def chunk_stats(emails, capacity=DEFAULT_CAPACITY):
+    """Summarize one chunk into mergeable partial statistics"""
+    domains = emails["from_domain"].astype(str)
+    return {
+        "total": len(emails.index),
+        "with_bodies": int(emails["has_body"].astype(bool).sum()),
+        "years": Counter(year_labels(emails)),
+        "top_domains": SpaceSaving(capacity).update_counts(domains.value_counts()),
+        "unique_domains": HyperLogLog().update(domains.unique()),
+    }
+
+
+def merge_stats(merged, partial):
+    """Merge partial statistics from another chunk or worker into merged"""
+    merged["total"] += partial["total"]
+    merged["with_bodies"] += partial["with_bodies"]
+    merged["years"].update(partial["years"])
+    merged["top_domains"].merge(partial["top_domains"])
+    merged["unique_domains"].merge(partial["unique_domains"])
+    return merged
+
+
+def approximate_stats(
+    input_file,
+    since=None,
+    until=None,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    capacity=DEFAULT_CAPACITY,
+):
+    """Show dataset statistics from streamed chunks and sketches"""
+    merged = empty_stats(capacity)
+    for chunk in iter_email_chunks(input_file, chunk_size, STATS_COLUMNS):
+        chunk = date_window(chunk, since, until)
+        merge_stats(merged, chunk_stats(chunk, capacity))
+
+    years = sorted(merged["years"])
+    print("Dataset Statistics (approximate):")
+    print(f"  Total emails: {merged['total']}")
+    print(f"  Emails with bodies: {merged['with_bodies']}")
+    print(f"  Unique domains: ~{merged['unique_domains'].estimate()}")
+    if years:
+        print(f"  Date range: {years[0]} to {years[-1]}")
+    print("\nTop 10 domains:")
+    for domain, count, error in merged["top_domains"].top(10):
+        bound = f" (+/- {error})" if error else ""
+        print(f"    {domain}: {count}{bound}")
+
+
+def stats(input_file, since=None, until=None):
+    """Show dataset statistics from an extracted dataset or a count cube"""
+    emails = load_counts(input_file, STATS_COLUMNS)
+    emails = date_window(emails, since, until)
+
+    counts = emails["count"]
+    domains = counts.groupby(emails["from_domain"].astype(str)).sum()
+    domains = domains.sort_values(ascending=False, kind="stable")
+    years = counts.groupby(year_labels(emails)).sum()
+    with_bodies = int(counts[emails["has_body"].astype(bool)].sum())
 
     print("Dataset Statistics:")
-    print(f"  Total emails: {len(emails.index)}")
+    print(f"  Total emails: {int(counts.sum())}")
     print(f"  Emails with bodies: {with_bodies}")
     print(f"  Unique domains: {len(domains.index)}")
     print(f"  Date range: {years.index.min()} to {years.index.max()}")
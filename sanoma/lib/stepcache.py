@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Content-hash cache for skipping unchanged workflow steps
+"""
+
+import hashlib
+import importlib.util
+import json
+import os
+import threading
+from pathlib import Path
+
+CACHE_VERSION = 1
+BLOCK_SIZE = 1 << 20
+
+
+class StepCache:
+    """Step records keyed by action, params, tool code and input content
+
+    File digests are memoized by (size, mtime) in ``stats.json`` so unchanged
+    datasets are not re-read on every run.
+    """
+
+    def __init__(self, cache_dir="cache/workflow"):
+        self.cache_dir = Path(cache_dir)
+        self.lock = threading.Lock()
+        self.code_digests = {}
+        try:
+            with open(self.cache_dir / "stats.json") as f:
+                self.memo = json.load(f)
+        except (OSError, ValueError):
+            self.memo = {}
+
+    def file_digest(self, path):
+        """Hash a file's content, reusing the memo while its stat is unchanged"""
+        stat = os.stat(path)
+        with self.lock:
+            cached = self.memo.get(path)
+        if cached and cached[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return cached[2]
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(BLOCK_SIZE), b""):
+                digest.update(block)
+        with self.lock:
+            self.memo[path] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+        return digest.hexdigest()
+
+    def path_digest(self, path):
+        """Hash a file, or a directory as its relative paths and file hashes"""
+        if not os.path.isdir(path):
+            return self.file_digest(path)
+        digest = hashlib.sha256()
+        for file in sorted(Path(path).rglob("*")):
+            if file.is_file():
+                digest.update(str(file.relative_to(path)).encode())
+                digest.update(self.file_digest(str(file)).encode())
+        return digest.hexdigest()
+
+    def code_digest(self, module_name):
+        """Hash a tool module's source together with the shared sanoma.lib code"""
+        with self.lock:
+            if module_name in self.code_digests:
+                return self.code_digests[module_name]
+        sources = [importlib.util.find_spec(module_name).origin]
+        sources += sorted(str(path) for path in Path(__file__).parent.glob("*.py"))
+        digest = hashlib.sha256()
+        for source in sources:
+            digest.update(Path(source).read_bytes())
+        with self.lock:
+            self.code_digests[module_name] = digest.hexdigest()
+        return digest.hexdigest()
+
+    def step_key(self, action, params, module_name, inputs):
+        """Build a step's cache key, or None if an input is missing"""
+        if not all(os.path.exists(path) for path in inputs):
+            return None
+        identity = {
+            "version": CACHE_VERSION,
+            "action": action,
+            "params": params,
+            "code": self.code_digest(module_name),
+            "inputs": {path: self.path_digest(path) for path in sorted(inputs)},
+        }
+        encoded = json.dumps(identity, sort_keys=True, default=str).encode()
+        return hashlib.sha256(encoded).hexdigest()
+
+    def output_digests(self, outputs):
+        """Hash a step's outputs, or None if any of them is missing"""
+        if not outputs or not all(os.path.exists(path) for path in outputs):
+            return None
+        return {path: self.path_digest(path) for path in sorted(outputs)}
+
+    def is_fresh(self, key, outputs):
+        """Check whether a step ran with this key and its outputs are untouched"""
+        try:
+            with open(self.cache_dir / f"{key}.json") as f:
+                recorded = json.load(f)
+        except (OSError, ValueError):
+            return False
+        return recorded == self.output_digests(outputs)
+
+    def record(self, key, outputs):
+        """Remember a successful step's outputs under its key"""
+        digests = self.output_digests(outputs)
+        if digests is not None:
+            self.write_json(f"{key}.json", digests)
+
+    def save(self):
+        """Persist the file digest memo"""
+        with self.lock:
+            memo = dict(self.memo)
+        self.write_json("stats.json", memo)
+
+    def write_json(self, name, data):
+        """Write a cache file atomically"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self.cache_dir / name
+        temp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        with open(temp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(temp_path, path)
@@ -3,24 +3,239 @@
 YAML workflow runner for Sanoma analysis pipelines
 """
 
-import yaml
+import importlib
+import io
+import itertools
+import os
+import re
+import sqlite3
 import subprocess
 import sys
 import argparse
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager, nullcontext
 from pathlib import Path
 
-from sanoma.lib.config import load_config
-
-
-def run_command(cmd, description=""):
-    """Run a command and return success/failure"""
+from sanoma.lib.config import (
+    get_default_complete_dataset_path,
+    get_profile_path,
+    load_config,
+)
+from sanoma.lib.dataset import forget_dataset, shared_datasets
+from sanoma.lib.output import write_data
+from sanoma.lib.profiling import (
+    RssSampler,
+    peak_rss_mb,
+    print_profile,
+    step_profile,
+    usage,
+)
+from sanoma.lib.stepcache import StepCache
+
+# Step params naming files a step reads or writes, for dependency inference.
+INPUT_PARAMS = ["input"]
+OUTPUT_PARAMS = ["output", "output_dir", "assign_output"]
+
+# Matrix values like "2014..2020" expand to inclusive integer ranges, and
+# "{name}" placeholders in params are filled from each matrix combination.
+MATRIX_RANGE = re.compile(r"(-?\d+)\.\.(-?\d+)")
+PLACEHOLDER = re.compile(r"\{(\w+)\}")
+
+_STREAMS_LOCK = threading.Lock()
+# Serializes live lines from concurrent steps; nested forwarders re-enter it.
+_LIVE_LOCK = threading.RLock()
+
+
+class ThreadOutput:
+    """Text stream that routes writes to the current thread's capture buffer"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    def target(self):
+        buffers = getattr(self.local, "buffers", None)
+        return buffers[-1] if buffers else self.stream
+
+    def write(self, text):
+        return self.target().write(text)
+
+    def flush(self):
+        self.target().flush()
+
+    def isatty(self):
+        return self.target().isatty()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def _thread_stream(name):
+    """Install a ThreadOutput wrapper over sys.stdout or sys.stderr once"""
+    with _STREAMS_LOCK:
+        stream = getattr(sys, name)
+        if not isinstance(stream, ThreadOutput):
+            stream = ThreadOutput(stream)
+            setattr(sys, name, stream)
+        return stream
+
+
+def current_stream(name):
+    """Get the stream this thread's writes to sys.stdout or sys.stderr reach"""
+    stream = getattr(sys, name)
+    return stream.target() if isinstance(stream, ThreadOutput) else stream
+
+
+class LiveOutput(io.StringIO):
+    """Buffer that also forwards each complete line to another stream live"""
+
+    def __init__(self, stream, prefix=""):
+        super().__init__()
+        self.stream = stream
+        self.prefix = prefix
+        self.partial = ""
+
+    def forward(self, lines):
+        with _LIVE_LOCK:
+            self.stream.write("".join(f"{self.prefix}{line}\n" for line in lines))
+            self.stream.flush()
+
+    def write(self, text):
+        lines = (self.partial + text).split("\n")
+        self.partial = lines.pop()
+        if lines:
+            self.forward(lines)
+        return super().write(text)
+
+    def drain(self):
+        """Forward a trailing line that never got its newline"""
+        if self.partial:
+            self.forward([self.partial])
+            self.partial = ""
+
+
+@contextmanager
+def capture_output(stdout, stderr=None):
+    """Capture this thread's prints into buffers, leaving other threads alone"""
+    captures = [(_thread_stream("stdout"), stdout)]
+    if stderr is not None:
+        captures.append((_thread_stream("stderr"), stderr))
+    for stream, buffer in captures:
+        stream.local.__dict__.setdefault("buffers", []).append(buffer)
+    try:
+        yield
+    finally:
+        for stream, _ in captures:
+            stream.local.buffers.pop()
+
+
+class ThreadArgv(list):
+    """sys.argv whose program name can be set per thread
+
+    argparse names a tool in usage and errors after ``sys.argv[0]``, so an
+    in-process tool sees the name it would get as its own process.
+    """
+
+    def __init__(self, argv):
+        super().__init__(argv)
+        self.local = threading.local()
+
+    def __getitem__(self, index):
+        program = getattr(self.local, "program", None)
+        if index == 0 and program is not None:
+            return program
+        return super().__getitem__(index)
+
+
+@contextmanager
+def program_name(name):
+    """Set sys.argv[0] for this thread while a tool's main() runs"""
+    with _STREAMS_LOCK:
+        if not isinstance(sys.argv, ThreadArgv):
+            sys.argv = ThreadArgv(sys.argv)
+        argv = sys.argv
+    previous = getattr(argv.local, "program", None)
+    argv.local.program = name
+    try:
+        yield
+    finally:
+        argv.local.program = previous
+
+
+def entry_point(cmd):
+    """Split a tool command into its module and the argv for its main()"""
+    if cmd[0] == "sanoma":
+        return "sanoma.main", cmd[1:]
+    return cmd[2], cmd[3:]
+
+
+def run_in_process(cmd):
+    """Call a tool's main() in this interpreter, capturing its output
+
+    Returns the exit status and captured stdout/stderr; SystemExit from
+    argparse or sys.exit is treated like a process exit code. Stderr, where
+    progress goes, is also passed through to the caller's stderr as it is
+    written.
+    """
+    module_name, argv = entry_point(cmd)
+    program = "sanoma" if cmd[0] == "sanoma" else f"{module_name.split('.')[-1]}.py"
+    stdout, stderr = io.StringIO(), LiveOutput(current_stream("stderr"))
+    returncode = 0
+    with capture_output(stdout, stderr), program_name(program):
+        try:
+            importlib.import_module(module_name).main(argv)
+        except SystemExit as e:
+            if isinstance(e.code, int):
+                returncode = e.code
+            elif e.code is not None:
+                print(e.code, file=sys.stderr)
+                returncode = 1
+        except Exception as e:
+            print(f"{type(e).__name__}: {e}", file=sys.stderr)
+            returncode = 1
+    stderr.drain()
+    return returncode, stdout.getvalue(), stderr.getvalue()
+
+
+def run_subprocess(cmd):
+    """Run a command as a subprocess, passing its stderr through live"""
+    stderr = LiveOutput(current_stream("stderr"))
+    with subprocess.Popen(
+        cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+    ) as process:
+
+        def forward():
+            for line in process.stderr:
+                stderr.write(line)
+
+        forwarder = threading.Thread(target=forward)
+        forwarder.start()
+        stdout = process.stdout.read()
+        forwarder.join()
+    stderr.drain()
+    return subprocess.CompletedProcess(
+        cmd, process.returncode, stdout, stderr.getvalue()
+    )
+
+
+def run_command(cmd, description="", isolated=False):
+    """Run a command and return success/failure
+
+    Tools run in-process by default so imports are paid once per workflow;
+    ``isolated`` runs the command as a subprocess instead.
+    """
     print(f"Running: {' '.join(cmd)}")
     if description:
         print(f"  → {description}")
 
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    if isolated:
+        result = run_subprocess(cmd)
+    else:
+        result = subprocess.CompletedProcess(cmd, *run_in_process(cmd))
     if result.returncode != 0:
-        print(f"Error: {result.stderr}")
+        print(f"Error: {result.stderr or result.stdout}")
         return False
     else:
         print(f"  ✓ {result.stdout.strip()}")
@@ -32,7 +247,7 @@ def find_tool_script(action):
     from pathlib import Path
 
     # Built-in sanoma actions
-    sanoma_actions = ["extract", "filter", "query", "stats"]
+    sanoma_actions = ["extract", "filter", "query", "stats", "cube"]
     if action in sanoma_actions:
         return ["sanoma", action]
 
@@ -41,6 +256,11 @@ def find_tool_script(action):
         "analyze_temporal": "timeline",
         "analyze_domains": "domains",
         "analyze_spam_keywords": "spam",
+        "analyze_anomalies": "anomalies",
+        "analyze_threads": "threads",
+        "analyze_graph": "graph",
+        "analyze_clusters": "clusters",
+        "analyze_classify": "classify",
         "plot_temporal": "timeline",
         "plot_spam_trends": "spam",
     }
@@ -79,14 +299,21 @@ def build_command(action, params):
 
     # Handle sanoma CLI commands
     if base_cmd[0] == "sanoma":
-        if action == "filter" and "input" in params and "output" in params:
-            cmd.extend([params["input"], params["output"]])
+        positional = []
+        if action in ["filter", "query", "cube"] and "input" in params:
+            positional = ["input", "output"]
+        elif action == "stats":
+            positional = ["input"]
+        cmd.extend(str(params[key]) for key in positional if key in params)
 
         # Add all other parameters as flags
         for key, value in params.items():
-            if key not in ["input", "output"]:
+            if key not in positional:
                 if isinstance(value, bool) and value:
                     cmd.append(f"--{key.replace('_', '-')}")
+                elif isinstance(value, list):
+                    cmd.append(f"--{key.replace('_', '-')}")
+                    cmd.extend(str(item) for item in value)
                 elif not isinstance(value, bool):
                     cmd.extend([f"--{key.replace('_', '-')}", str(value)])
     else:
@@ -103,17 +330,27 @@ def build_command(action, params):
             if key not in ["input", "compare_pattern"]:
                 if isinstance(value, bool) and value:
                     cmd.append(f"--{key.replace('_', '-')}")
+                elif isinstance(value, list):
+                    cmd.append(f"--{key.replace('_', '-')}")
+                    cmd.extend(str(item) for item in value)
                 elif not isinstance(value, bool):
                     cmd.extend([f"--{key.replace('_', '-')}", str(value)])
 
     return cmd
 
 
-def execute_step(step, config):
-    """Execute a single workflow step"""
+def execute_step(step, config, cache=None, force=False):
+    """Execute a single workflow step
+
+    With a cache, a step whose key (action, params, tool code and input
+    content) matches a previous run with untouched outputs is skipped. A
+    ``force`` flag on the workflow, the step or its params bypasses the
+    cache; the runner consumes it rather than passing it to the tool.
+    """
     action = step.get("action")
     name = step.get("name", "unnamed")
-    params = step.get("params", {})
+    params = dict(step.get("params", {}))
+    force = params.pop("force", False) or step.get("force", False) or force
 
     print(f"\n--- Step: {name} ({action}) ---")
 
@@ -122,46 +359,506 @@ def execute_step(step, config):
         print(f"Unknown action or tool not found: {action}")
         return False
 
+    key = None
+    if cache is not None:
+        inputs, outputs = step_paths(step, config)
+        key = cache.step_key(action, params, entry_point(cmd)[0], inputs)
+        if key and not force and cache.is_fresh(key, outputs):
+            print(f"  ✓ Up to date, skipping {action}")
+            return True
+
     description = f"Running {action}"
     if "output" in params:
         description += f" -> {params['output']}"
 
-    return run_command(cmd, description)
-
-
-def run_workflow(workflow_file):
-    """Execute a complete workflow from YAML file"""
-    config = load_config()
+    # pyplot keeps process-wide figure and backend state; plots get their own.
+    isolated = step.get("subprocess", False) or entry_point(cmd)[0].startswith(
+        "sanoma.plot."
+    )
+    success = run_command(cmd, description, isolated=isolated)
+    if success and key:
+        cache.record(key, outputs)
+    return success
+
+
+def matrix_values(values):
+    """Expand one matrix variable's values, turning "a..b" into a range"""
+    expanded = []
+    for value in values if isinstance(values, list) else [values]:
+        match = MATRIX_RANGE.fullmatch(str(value).strip())
+        if match:
+            expanded.extend(range(int(match.group(1)), int(match.group(2)) + 1))
+        else:
+            expanded.append(value)
+    return expanded
+
+
+def substitute(value, variables):
+    """Fill "{name}" placeholders in a param value from matrix variables
+
+    A value that is exactly one placeholder takes the variable's own type, so
+    ``year: "{year}"`` stays an integer. Unknown placeholders are left alone.
+    """
+    if isinstance(value, list):
+        return [substitute(item, variables) for item in value]
+    if not isinstance(value, str):
+        return value
+    whole = PLACEHOLDER.fullmatch(value)
+    if whole and whole.group(1) in variables:
+        return variables[whole.group(1)]
+    return PLACEHOLDER.sub(
+        lambda match: str(variables.get(match.group(1), match.group(0))), value
+    )
+
+
+def expand_matrix(steps):
+    """Expand steps with a ``matrix`` key into one step per combination
+
+    Instances keep the template's name for ``depends_on`` and get a name
+    filled from the matrix, or suffixed with its values.
+    """
+    expanded = []
+    for step in steps:
+        matrix = step.get("matrix")
+        if not matrix:
+            expanded.append(step)
+            continue
+
+        name = step.get("name", "unnamed")
+        variables = list(matrix)
+        instances = []
+        for combination in itertools.product(
+            *(matrix_values(matrix[variable]) for variable in variables)
+        ):
+            values = dict(zip(variables, combination))
+            instance = {key: value for key, value in step.items() if key != "matrix"}
+            instance["params"] = {
+                key: substitute(value, values)
+                for key, value in step.get("params", {}).items()
+            }
+            instance_name = str(substitute(name, values))
+            if instance_name == name:
+                labels = ", ".join(f"{key}={value}" for key, value in values.items())
+                instance_name = f"{name} [{labels}]"
+            instance["name"] = instance_name
+            instance["matrix_name"] = name
+            instances.append(instance)
+
+        outputs = {
+            str(instance["params"].get(key))
+            for instance in instances
+            for key in OUTPUT_PARAMS
+            if key in instance["params"]
+        }
+        if len(instances) > 1 and len(outputs) == 1:
+            raise ValueError(
+                f"Matrix step '{name}' writes the same output for every "
+                f"combination; template it with {{{variables[0]}}}"
+            )
+        expanded.extend(instances)
+    return expanded
+
+
+def step_paths(step, config):
+    """Get the normalized files a step reads and writes
+
+    Besides ``input``, any other param naming an existing file (such as a
+    keyword list) counts as an input. Extract reads the Gloda database along
+    with its write-ahead log and shared-memory files, since Thunderbird's
+    commits sit in the log until a checkpoint.
+    """
+    params = step.get("params", {})
+    inputs = [params[key] for key in INPUT_PARAMS if key in params]
+    outputs = [params[key] for key in OUTPUT_PARAMS if key in params]
+    for key, value in params.items():
+        if key in INPUT_PARAMS or key in OUTPUT_PARAMS:
+            continue
+        for item in value if isinstance(value, list) else [value]:
+            if isinstance(item, str) and os.path.isfile(item):
+                inputs.append(item)
+    if step.get("action") == "extract":
+        if "output" not in params:
+            outputs.append(get_default_complete_dataset_path(config))
+        try:
+            profile = get_profile_path(config, params.get("profile"))
+            database = Path(profile) / "global-messages-db.sqlite"
+            inputs.append(database)
+            for suffix in ["-wal", "-shm"]:
+                sidecar = database.with_name(database.name + suffix)
+                if sidecar.exists():
+                    inputs.append(sidecar)
+        except ValueError:
+            pass
+    return (
+        {os.path.normpath(str(path)) for path in inputs},
+        {os.path.normpath(str(path)) for path in outputs},
+    )
+
+
+def paths_overlap(paths, others):
+    """Check whether any path equals or contains a path of the other set"""
+    return any(
+        path == other
+        or other.startswith(path + os.sep)
+        or path.startswith(other + os.sep)
+        for path in paths
+        for other in others
+    )
+
+
+def step_dependencies(steps, config):
+    """Infer each step's prerequisites from the files steps read and write
+
+    A step waits for every earlier step that writes what it reads, reads what
+    it writes, or writes the same files, plus any steps named in
+    ``depends_on``.
+    """
+    names = {}
+    for i, step in enumerate(steps):
+        for name in {step.get("name", "unnamed"), step.get("matrix_name")} - {None}:
+            names.setdefault(name, []).append(i)
+    paths = [step_paths(step, config) for step in steps]
+    dependencies = []
+    for i, step in enumerate(steps):
+        inputs, outputs = paths[i]
+        required = {
+            j
+            for j, (earlier_inputs, earlier_outputs) in enumerate(paths[:i])
+            if paths_overlap(inputs | outputs, earlier_outputs)
+            or paths_overlap(outputs, earlier_inputs)
+        }
+        depends_on = step.get("depends_on", [])
+        for name in [depends_on] if isinstance(depends_on, str) else depends_on:
+            if name not in names:
+                raise ValueError(f"Unknown step in depends_on: {name}")
+            required.update(names[name])
+        dependencies.append(required - {i})
+    return dependencies
+
+
+def run_step(step, config, cache=None, force=False, profile=False, stderr=None):
+    """Execute a step on a worker thread
+
+    The step's stdout is collected into a log for the runner to print in one
+    block; its stderr (progress and warnings) goes to ``stderr`` live, each
+    line prefixed with the step name. Returns success, the log and, when
+    profiling, the step's resource profile.
+    """
+    log = io.StringIO()
+    stream = stderr or current_stream("stderr")
+    live = LiveOutput(stream, f"[{step.get('name', 'unnamed')}] ")
+    start = usage()
+    with RssSampler() if profile else nullcontext() as rss, capture_output(log, live):
+        try:
+            success = execute_step(step, config, cache, force)
+        except Exception as e:
+            print(f"Error: {e}")
+            success = False
+    live.drain()
+    measured = step_profile(start, *step_paths(step, config), rss) if profile else None
+    return success, log.getvalue(), measured
+
+
+def run_steps(
+    steps,
+    dependencies,
+    config,
+    jobs,
+    cache=None,
+    force=False,
+    profile=False,
+    release=False,
+):
+    """Run steps as a DAG on a bounded thread pool
+
+    Steps start as soon as their prerequisites succeed. A failure cancels only
+    the steps downstream of it; independent branches keep running. With
+    ``release``, a shared dataset is dropped once every step reading it has
+    finished or been cancelled. Returns each step's status and, when
+    profiling, its resource profile.
+    """
+    status = {}
+    profiles = {}
+    pending = set(range(len(steps)))
+    running = {}
+    inputs = [step_paths(step, config)[0] for step in steps]
+    readers = {}
+    for paths in inputs:
+        for path in paths:
+            readers[path] = readers.get(path, 0) + 1
+
+    def finished(i):
+        for path in inputs[i]:
+            readers[path] -= 1
+            if release and not readers[path]:
+                forget_dataset(path)
+
+    # Worker threads have no capture of their own; send live lines here.
+    stderr = current_stream("stderr")
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        while pending or running:
+            scheduled = True
+            while scheduled:
+                scheduled = False
+                for i in sorted(pending):
+                    if any(status[d] != "ok" for d in dependencies[i] if d in status):
+                        status[i] = "cancelled"
+                        pending.discard(i)
+                        finished(i)
+                        scheduled = True
+                        print(f"\n{'=' * 50}")
+                        print(
+                            f"Step {i + 1}/{len(steps)} cancelled: prerequisite failed"
+                        )
+                    elif all(status.get(d) == "ok" for d in dependencies[i]):
+                        pending.discard(i)
+                        future = pool.submit(
+                            run_step, steps[i], config, cache, force, profile, stderr
+                        )
+                        running[future] = i
+
+            if not running:
+                # Whatever is left waits on itself through depends_on.
+                for i in sorted(pending):
+                    status[i] = "failed"
+                    print(f"Step {i + 1}/{len(steps)} failed: dependency cycle")
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                i = running.pop(future)
+                success, log, profiles[i] = future.result()
+                status[i] = "ok" if success else "failed"
+                finished(i)
+                print(f"\n{'=' * 50}")
+                print(f"Step {i + 1}/{len(steps)}")
+                print(log, end="")
+                if not success:
+                    print(f"Step {i + 1} failed. Cancelling dependent steps.")
+
+    return status, profiles
+
+
+def read_workflow(workflow_file):
+    """Parse a workflow YAML file"""
+    import yaml
 
     with open(workflow_file, "r") as f:
-        workflow = yaml.safe_load(f)
+        return yaml.safe_load(f)
+
+
+def run_workflow(
+    workflow_file,
+    jobs=None,
+    force=False,
+    cache_dir="cache/workflow",
+    profile=None,
+    incremental=False,
+):
+    """Execute a complete workflow from YAML file
+
+    With ``profile``, steps run one at a time and per-step wall/CPU time,
+    peak RSS and input/output sizes and row counts are written to that file
+    and summarized at the end.
+    ``incremental`` makes extract steps only add newly indexed messages.
+    """
+    config = load_config()
+    workflow = read_workflow(workflow_file)
 
     print(f"Starting workflow: {workflow.get('name', 'Unnamed')}")
     if "description" in workflow:
         print(f"Description: {workflow['description']}")
 
-    steps = workflow.get("steps", [])
-    success_count = 0
+    steps = expand_matrix(workflow.get("steps", []))
+    if incremental:
+        for step in steps:
+            if step.get("action") == "extract":
+                step["params"] = {"incremental": True, **step.get("params", {})}
+    dependencies = step_dependencies(steps, config)
+    cache = StepCache(cache_dir) if cache_dir else None
+    jobs = jobs or os.cpu_count() or 1
+    if profile and jobs > 1:
+        # Overlapping steps would share RSS samples and child CPU time.
+        print("Profiling runs steps one at a time")
+        jobs = 1
+    start = usage()
+    # In-process steps reading the same dataset share one parsed copy.
+    with shared_datasets() as owned:
+        status, profiles = run_steps(
+            steps, dependencies, config, jobs, cache, force, bool(profile), owned
+        )
+    if cache is not None:
+        cache.save()
+    success_count = sum(result == "ok" for result in status.values())
+
+    print(f"\n{'=' * 50}")
+    print(f"Workflow completed: {success_count}/{len(steps)} steps successful")
 
-    for i, step in enumerate(steps, 1):
-        print(f"\n{'='*50}")
-        print(f"Step {i}/{len(steps)}")
+    if profile:
+        step_profiles = [
+            {
+                "step": i + 1,
+                "name": step.get("name", "unnamed"),
+                "action": step.get("action"),
+                "status": status.get(i, "failed"),
+                **(profiles.get(i) or {}),
+            }
+            for i, step in enumerate(steps)
+        ]
+        print_profile(step_profiles)
+        report = {
+            "workflow": workflow.get("name", "Unnamed"),
+            "jobs": jobs,
+            "wall_seconds": usage()["wall"] - start["wall"],
+            "process_peak_rss_mb": peak_rss_mb(),
+            "steps": step_profiles,
+        }
+        format_used = write_data(report, profile, "json")
+        print(f"Profile saved to {profile} ({format_used})")
 
-        if execute_step(step, config):
-            success_count += 1
-        else:
-            print(f"Step {i} failed. Stopping workflow.")
-            break
+    return success_count == len(steps)
 
-    print(f"\n{'='*50}")
-    print(f"Workflow completed: {success_count}/{len(steps)} steps successful")
 
-    return success_count == len(steps)
+class DatabaseWatch:
+    """Cheap change detection for SQLite databases without reading their pages
+
+    A database's signature combines the size, mtime and inode of the file and
+    its write-ahead log with ``PRAGMA data_version``, which changes whenever
+    another connection commits.
+    """
+
+    def __init__(self, paths):
+        self.paths = sorted(paths)
+        self.connections = {}
+
+    def data_version(self, path, inode):
+        """Read data_version on a connection kept open across polls"""
+        inode_connection = self.connections.get(path)
+        if inode_connection is None or inode_connection[0] != inode:
+            # A replaced file needs a new connection to see its commits.
+            if inode_connection is not None:
+                inode_connection[1].close()
+            uri = f"{Path(path).resolve().as_uri()}?mode=ro"
+            inode_connection = (inode, sqlite3.connect(uri, uri=True))
+            self.connections[path] = inode_connection
+        try:
+            return inode_connection[1].execute("PRAGMA data_version").fetchone()[0]
+        except sqlite3.Error:
+            # Thunderbird may hold an exclusive lock; stat changes still count.
+            return None
+
+    def signature(self):
+        """Get the current signature of every watched database"""
+        signature = []
+        for path in self.paths:
+            files = []
+            for name in [path, f"{path}-wal"]:
+                try:
+                    stat = os.stat(name)
+                except OSError:
+                    files.append(None)
+                    continue
+                files.append((stat.st_ino, stat.st_size, stat.st_mtime_ns))
+            version = self.data_version(path, files[0][0]) if files[0] else None
+            signature.append((files, version))
+        return signature
+
+    def close(self):
+        for _, connection in self.connections.values():
+            connection.close()
+        self.connections = {}
+
+
+def watch_workflow(workflow_file, interval=30.0, debounce=5.0, **options):
+    """Run a workflow, then refresh it whenever its Gloda databases change
+
+    Extract steps run incrementally and the step cache skips every step whose
+    inputs are unchanged, so a refresh only re-runs what new mail affects. A
+    change is acted on once the database has been quiet for ``debounce``
+    seconds. ``force`` applies to the first run only.
+    """
+    config = load_config()
+    steps = expand_matrix(read_workflow(workflow_file).get("steps", []))
+    databases = {
+        path
+        for step in steps
+        if step.get("action") == "extract"
+        for path in step_paths(step, config)[0]
+    }
+    if not databases:
+        raise ValueError("Workflow has no extract step with a Gloda database to watch")
+
+    watch = DatabaseWatch(databases)
+    try:
+        seen = watch.signature()
+        run_workflow(workflow_file, incremental=True, **options)
+        options["force"] = False
+        while True:
+            print(f"\nWatching {', '.join(watch.paths)} (Ctrl-C to stop)")
+            current = seen
+            while current == seen:
+                time.sleep(interval)
+                current = watch.signature()
+            # Thunderbird indexes in bursts; wait for the writes to settle.
+            while True:
+                time.sleep(debounce)
+                latest = watch.signature()
+                if latest == current:
+                    break
+                current = latest
+            # Changes made while the refresh runs trigger the next one.
+            seen = current
+            print("\nGloda database changed, refreshing workflow")
+            try:
+                run_workflow(workflow_file, incremental=True, **options)
+            except Exception as e:
+                print(f"Error: {e}")
+    except KeyboardInterrupt:
+        print("\nStopped watching")
+    finally:
+        watch.close()
 
 
 def main():
     parser = argparse.ArgumentParser(description="Run YAML-defined analysis workflows")
     parser.add_argument("workflow_file", help="Path to workflow YAML file")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        help="Steps to run concurrently (default: CPU count)",
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="Re-run steps even if up to date"
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default="cache/workflow",
+        help="Directory for step records (default: cache/workflow)",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="Run every step without the cache"
+    )
+    parser.add_argument(
+        "--profile", help="Write per-step time, memory and row counts to this file"
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running and refresh outputs when the Gloda database changes",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=30.0,
+        help="Seconds between Gloda change checks when watching (default: 30)",
+    )
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=5.0,
+        help="Seconds the database must stay unchanged before a refresh (default: 5)",
+    )
 
     args = parser.parse_args()
 
@@ -169,7 +866,21 @@ def main():
         print(f"Error: Workflow file '{args.workflow_file}' not found")
         sys.exit(1)
 
-    success = run_workflow(args.workflow_file)
+    cache_dir = None if args.no_cache else args.cache_dir
+    if args.watch:
+        watch_workflow(
+            args.workflow_file,
+            args.interval,
+            args.debounce,
+            jobs=args.jobs,
+            force=args.force,
+            cache_dir=cache_dir,
+            profile=args.profile,
+        )
+        sys.exit(0)
+    success = run_workflow(
+        args.workflow_file, args.jobs, args.force, cache_dir, args.profile
+    )
     sys.exit(0 if success else 1)
 
 
@@ -3,22 +3,28 @@ Sanoma - Email analysis and workflow orchestration for Thunderbird
 """
 
 import argparse
+import os
+import sys
 
-from sanoma.lib.output import write_data
 from sanoma.lib.config import (
     load_config,
     get_profile_path,
     get_default_complete_dataset_path,
 )
-from sanoma.lib.extract import extract_complete_dataset
-from sanoma.lib.filter import filter_emails
-from sanoma.lib.query import query_emails
-from sanoma.lib.stats import stats
+from sanoma.lib.dates import add_date_range_arguments
+from sanoma.lib.sketch import add_sketch_arguments
 
+# Command implementations are imported inside their branches so that --help,
+# extract and workflow do not pay for pandas, numpy or matplotlib.
 
-def main():
+
+def main(argv=None):
     """Entry point for sanoma CLI"""
     parser = argparse.ArgumentParser(description="Sanoma - Thunderbird email analysis")
+    parser.add_argument(
+        "--server",
+        help="Send commands to a running `sanoma serve` (default: $SANOMA_SERVER)",
+    )
     subparsers = parser.add_subparsers(dest="command", help="Commands")
 
     # Extract command
@@ -27,6 +33,11 @@ def main():
     )
     extract_parser.add_argument("--profile", help="Path to Thunderbird profile")
     extract_parser.add_argument("--output", help="Output file")
+    extract_parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only add messages indexed since the previous extract to this output",
+    )
 
     # Filter command
     filter_parser = subparsers.add_parser("filter", help="Filter emails")
@@ -34,10 +45,16 @@ def main():
     filter_parser.add_argument("output_file", help="Output file")
     filter_parser.add_argument("--domain", help="Filter by domain")
     filter_parser.add_argument("--year", help="Filter by year")
+    add_date_range_arguments(filter_parser)
     filter_parser.add_argument("--subject-contains", help="Filter by subject content")
     filter_parser.add_argument(
         "--has-body", action="store_true", help="Only emails with bodies"
     )
+    filter_parser.add_argument(
+        "--cluster-id",
+        type=int,
+        help="Only emails in this near-duplicate cluster (-1 = unclustered)",
+    )
     filter_parser.add_argument("--limit", type=int, help="Limit results")
 
     # Query command
@@ -48,53 +65,190 @@ def main():
     query_parser.add_argument(
         "--case-sensitive", action="store_true", help="Case sensitive search"
     )
+    add_date_range_arguments(query_parser)
 
     # Stats command
     stats_parser = subparsers.add_parser("stats", help="Show dataset statistics")
     stats_parser.add_argument("input_file", help="Input JSON file")
+    add_date_range_arguments(stats_parser)
+    add_sketch_arguments(stats_parser)
+
+    # Cube command
+    cube_parser = subparsers.add_parser(
+        "cube", help="Pre-aggregate daily message counts for text-free analyses"
+    )
+    cube_parser.add_argument("input_file", help="Input JSON file")
+    cube_parser.add_argument("output_file", help="Output cube file (.csv)")
 
     # Workflow command
     workflow_parser = subparsers.add_parser("workflow", help="Run YAML workflow")
     workflow_parser.add_argument("workflow_file", help="Path to workflow YAML file")
+    workflow_parser.add_argument(
+        "--jobs",
+        type=int,
+        help="Steps to run concurrently (default: CPU count)",
+    )
+    workflow_parser.add_argument(
+        "--force", action="store_true", help="Re-run steps even if up to date"
+    )
+    workflow_parser.add_argument(
+        "--cache-dir",
+        default="cache/workflow",
+        help="Directory for step records (default: cache/workflow)",
+    )
+    workflow_parser.add_argument(
+        "--no-cache", action="store_true", help="Run every step without the cache"
+    )
+    workflow_parser.add_argument(
+        "--profile", help="Write per-step time, memory and row counts to this file"
+    )
+    workflow_parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running and refresh outputs when the Gloda database changes",
+    )
+    workflow_parser.add_argument(
+        "--interval",
+        type=float,
+        default=30.0,
+        help="Seconds between Gloda change checks when watching (default: 30)",
+    )
+    workflow_parser.add_argument(
+        "--debounce",
+        type=float,
+        default=5.0,
+        help="Seconds the database must stay unchanged before a refresh (default: 5)",
+    )
 
-    args = parser.parse_args()
+    # Serve command
+    serve_parser = subparsers.add_parser(
+        "serve", help="Keep datasets loaded and answer commands over localhost"
+    )
+    serve_parser.add_argument(
+        "--dataset",
+        nargs="*",
+        help="Datasets to preload (default: the configured complete dataset)",
+    )
+    serve_parser.add_argument(
+        "--host", default="127.0.0.1", help="Address to bind (default: 127.0.0.1)"
+    )
+    serve_parser.add_argument(
+        "--port", type=int, default=8765, help="Port to listen on (default: 8765)"
+    )
+    serve_parser.add_argument(
+        "--interval",
+        type=float,
+        default=2.0,
+        help="Seconds between dataset change checks (default: 2)",
+    )
+
+    args = parser.parse_args(argv)
+
+    # Only a real command line picks up $SANOMA_SERVER; in-process callers such
+    # as the server itself and the workflow runner pass argv explicitly.
+    server = args.server or (os.environ.get("SANOMA_SERVER") if argv is None else None)
+    if server:
+        from sanoma.lib.server import REMOTE_COMMANDS, run_remote
 
     try:
-        config = load_config()
+        # A watch never finishes, so it runs here rather than hold a request.
+        watch = getattr(args, "watch", False)
+        if server and args.command in REMOTE_COMMANDS and not watch:
+            arguments = sys.argv[1:] if argv is None else argv
+            command = arguments[arguments.index(args.command) :]
+            result = run_remote(server, ["sanoma", *command])
+            if result is not None:
+                print(result["stdout"], end="")
+                print(result["stderr"], end="", file=sys.stderr)
+                sys.exit(result["returncode"])
 
         if args.command == "extract":
+            from sanoma.lib.extract import extract_complete_dataset
+
+            config = load_config()
             profile = get_profile_path(config, args.profile)
             output = args.output or get_default_complete_dataset_path(config)
-            extract_complete_dataset(profile, output, config)
+            extract_complete_dataset(profile, output, config, args.incremental)
         elif args.command == "filter":
+            from sanoma.lib.filter import filter_emails
+
             filter_emails(
                 args.input_file,
                 args.output_file,
                 domain=args.domain,
                 year=args.year,
+                since=args.since,
+                until=args.until,
                 subject_contains=args.subject_contains,
                 has_body=args.has_body,
+                cluster_id=args.cluster_id,
                 limit=args.limit,
             )
         elif args.command == "query":
-            results = query_emails(args.input_file, args.pattern, args.case_sensitive)
+            from sanoma.lib.output import write_data
+            from sanoma.lib.query import query_emails
+
+            results = query_emails(
+                args.input_file,
+                args.pattern,
+                args.case_sensitive,
+                since=args.since,
+                until=args.until,
+            )
             format_used = write_data(results, args.output_file, "json")
             print(
                 f"Found {len(results)} matching emails, saved to "
                 f"{args.output_file} ({format_used})"
             )
         elif args.command == "stats":
-            stats(args.input_file)
+            from sanoma.lib.stats import approximate_stats, stats
+
+            if args.approximate:
+                approximate_stats(
+                    args.input_file,
+                    since=args.since,
+                    until=args.until,
+                    chunk_size=args.chunk_size,
+                    capacity=args.capacity,
+                )
+            else:
+                stats(args.input_file, since=args.since, until=args.until)
+        elif args.command == "cube":
+            from sanoma.lib.cube import create_cube
+
+            create_cube(args.input_file, args.output_file)
+        elif args.command == "serve":
+            from sanoma.lib.server import serve
+
+            datasets = args.dataset
+            if datasets is None:
+                default_dataset = get_default_complete_dataset_path(load_config())
+                datasets = [default_dataset] if os.path.exists(default_dataset) else []
+            serve(datasets, args.host, args.port, args.interval)
         elif args.command == "workflow":
-            from sanoma.lib.workflow import run_workflow
+            from sanoma.lib.workflow import run_workflow, watch_workflow
 
-            success = run_workflow(args.workflow_file)
-            exit(0 if success else 1)
+            cache_dir = None if args.no_cache else args.cache_dir
+            if args.watch:
+                watch_workflow(
+                    args.workflow_file,
+                    args.interval,
+                    args.debounce,
+                    jobs=args.jobs,
+                    force=args.force,
+                    cache_dir=cache_dir,
+                    profile=args.profile,
+                )
+                sys.exit(0)
+            success = run_workflow(
+                args.workflow_file, args.jobs, args.force, cache_dir, args.profile
+            )
+            sys.exit(0 if success else 1)
         else:
             parser.print_help()
     except Exception as e:
         print(f"Error: {e}")
-        exit(1)
+        sys.exit(1)
 
 
 if __name__ == "__main__":
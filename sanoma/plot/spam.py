@@ -207,7 +207,7 @@ def create_yearly_heatmap(
         plt.close()
 
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Generate spam trend visualizations")
     parser.add_argument("input_file", help="Input spam analysis data (JSON)")
     parser.add_argument(
@@ -227,7 +227,7 @@ def main():
         help="How to handle plots",
     )
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     # Create output directory
     output_dir = Path(args.output_dir)
@@ -10,6 +10,8 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 
+from sanoma.lib.cube import is_cube, load_counts
+
 
 def create_year_over_year_histogram(
     emails, output_file, title="Email Volume", display_method="save"
@@ -26,9 +28,9 @@ def create_year_over_year_histogram(
             year=parsed_emails["date_parsed"].dt.year,
             month_name=parsed_emails["date_parsed"].dt.strftime("%b"),
         )
-        .groupby(["year", "month_name"])
-        .size()
-        .reset_index(name="count")
+        .groupby(["year", "month_name"])["count"]
+        .sum()
+        .reset_index()
     )
 
     # Create pivot table for stacked histogram
@@ -101,8 +103,8 @@ def create_simple_timeline(
         return
 
     month_counts = (
-        parsed_emails.groupby(parsed_emails["date_parsed"].dt.to_period("M"))
-        .size()
+        parsed_emails.groupby(parsed_emails["date_parsed"].dt.to_period("M"))["count"]
+        .sum()
         .sort_index()
     )
     dates = [period.to_timestamp() for period in month_counts.index]
@@ -143,7 +145,7 @@ def create_simple_timeline(
         plt.close()
 
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(
         description="Generate temporal plots from email datasets"
     )
@@ -168,20 +170,21 @@ def main():
         help="How to handle the plot (default: save)",
     )
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     # Create output directory
     output_dir = Path(args.output_dir)
-    output_dir.mkdir(exist_ok=True)
-
-    # Load emails
-    emails = pd.read_json(args.input_file)
-    required_columns = {"date", "to"}
-    missing_columns = required_columns.difference(emails.columns)
-    if missing_columns:
-        raise ValueError(
-            f"Missing required columns in JSON: {', '.join(sorted(missing_columns))}"
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    # Load emails, or a count cube when no recipient filter is needed
+    if args.filter_domain and is_cube(args.input_file):
+        parser.error(
+            "--filter-domain matches recipients, which the count cube does not "
+            "store; use the extracted dataset"
         )
+    emails = load_counts(
+        args.input_file, {"date", "to"} if args.filter_domain else {"date"}
+    )
     date_series = pd.to_datetime(
         emails["date"].astype(str).str.slice(0, 19),
         format="%Y-%m-%d %H:%M:%S",
@@ -194,7 +197,7 @@ def main():
         to_lower = emails["to"].astype(str).str.lower()
         emails = emails[to_lower.str.contains(args.filter_domain.lower(), na=False)]
         print(
-            f"Filtered to {len(emails.index)} emails with recipient domain "
+            f"Filtered to {int(emails['count'].sum())} emails with recipient domain "
             f"'{args.filter_domain}'"
         )
 
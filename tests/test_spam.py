@@ -0,0 +1,80 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from sanoma.analysis.spam import (
+    analyze_spam_keywords,
+    load_cache,
+    pattern_set_hash,
+    save_cache,
+)
+
+PATTERNS = {"survey": r"\bsurvey\b", "unsubscribe": r"unsubscribe"}
+
+
+def make_emails(month, count=4):
+    return pd.DataFrame(
+        {
+            "date": [
+                f"2019-{month:02d}-{day + 1:02d} 12:00:00" for day in range(count)
+            ],
+            "subject": ["Take our survey", "Lunch", "Hello", "News"][:count],
+            "body": ["", "see you", "", "click to unsubscribe"][:count],
+        }
+    )
+
+
+def cached_months(cache_dir):
+    with open(cache_dir / f"{pattern_set_hash(PATTERNS)}.json") as f:
+        set_months = set(json.load(f)["months"])
+    column_months = []
+    for path in sorted((cache_dir / "columns").glob("*.json")):
+        with open(path) as f:
+            column_months.append(set(json.load(f)["months"]))
+    return set_months, column_months
+
+
+def test_disjoint_windows_keep_each_others_months(tmp_path, capsys):
+    january, february = make_emails(1), make_emails(2)
+
+    analyze_spam_keywords(january, PATTERNS, cache_dir=tmp_path)
+    analyze_spam_keywords(february, PATTERNS, cache_dir=tmp_path)
+
+    set_months, column_months = cached_months(tmp_path)
+    assert set_months == {"2019-01", "2019-02"}
+    assert column_months == [{"2019-01", "2019-02"}] * len(PATTERNS)
+
+    capsys.readouterr()
+    full = analyze_spam_keywords(
+        pd.concat([february, january], ignore_index=True), PATTERNS, cache_dir=tmp_path
+    )
+    assert "Reusing cached counts for 2/2 months" in capsys.readouterr().out
+    assert full == analyze_spam_keywords(
+        pd.concat([february, january], ignore_index=True), PATTERNS
+    )
+
+
+def test_changed_month_is_replaced(tmp_path):
+    analyze_spam_keywords(make_emails(1), PATTERNS, cache_dir=tmp_path)
+    first = cached_months(tmp_path)
+
+    edited = make_emails(1)
+    edited.loc[1, "body"] = "please unsubscribe"
+    analysis = analyze_spam_keywords(edited, PATTERNS, cache_dir=tmp_path)
+
+    assert cached_months(tmp_path) == first
+    assert analysis == analyze_spam_keywords(edited, PATTERNS)
+
+
+def test_concurrent_writers_do_not_share_a_temp_file(tmp_path):
+    path = tmp_path / "months.json"
+    payloads = [{"months": {f"2019-{i:02d}": i}} for i in range(1, 13)]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(
+            pool.map(lambda data: [save_cache(path, data) for _ in range(20)], payloads)
+        )
+
+    assert load_cache(path) in payloads
+    assert [p.name for p in tmp_path.iterdir()] == ["months.json"]